@@ -2,6 +2,7 @@ import g4f
 
 from status import *
 from config import *
+from utils import get_selenium_service_kwargs, register_selenium_service, unregister_selenium_service
 from constants import *
 from .Twitter import Twitter
 from selenium_firefox import *
@@ -43,11 +44,14 @@ class AffiliateMarketing:
         self.options.add_argument(fp_profile_path)
         
         # Set the service
-        self.service: Service = Service(GeckoDriverManager().install())
+        self.service: Service = Service(GeckoDriverManager().install(), **get_selenium_service_kwargs())
 
         # Initialize the browser
         self.browser: webdriver.Firefox = webdriver.Firefox(service=self.service, options=self.options)
 
+        # Remember the process group of the driver and browser, to kill them in one go
+        self.pgid: int = register_selenium_service(self.service)
+
         # Set the affiliate link
         self.affiliate_link: str = affiliate_link
 
@@ -148,3 +152,4 @@ class AffiliateMarketing:
         """
         # Quit the browser
         self.browser.quit()
+        unregister_selenium_service(self.pgid)
@@ -5,6 +5,7 @@ import time
 
 from cache import *
 from config import *
+from utils import get_selenium_service_kwargs, register_selenium_service
 from status import *
 from constants import *
 from typing import List
@@ -53,11 +54,14 @@ class Twitter:
         self.options.add_argument(fp_profile_path)
 
         # Set the service
-        self.service: Service = Service(GeckoDriverManager().install())
+        self.service: Service = Service(GeckoDriverManager().install(), **get_selenium_service_kwargs())
 
         # Initialize the browser
         self.browser: webdriver.Firefox = webdriver.Firefox(service=self.service, options=self.options)
 
+        # Remember the process group of the driver and browser, to kill them in one go
+        self.pgid: int = register_selenium_service(self.service)
+
     def post(self, text: str = None) -> None:
         """
         Starts the Twitter Bot.
@@ -1,11 +1,15 @@
 import re
 import g4f
 import json
-import shutil
+import numpy as np
+import subprocess
+import functools
+import textwrap
 import requests
-import assemblyai as aai
 import ssl
 import time
+import random
+import threading
 
 from utils import *
 from cache import *
@@ -14,20 +18,299 @@ from config import *
 from status import *
 from uuid import uuid4
 from constants import *
-from typing import List
+from typing import List, Tuple, Union
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as UrllibHTTPError
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future, ThreadPoolExecutor
 from moviepy.editor import *
+from PIL import Image, ImageDraw, ImageFont
 from termcolor import colored
-from moviepy.video.fx.all import crop
-from moviepy.config import change_settings
+from moviepy.config import change_settings, get_setting
 from moviepy.video.tools.subtitles import SubtitlesClip
 from datetime import datetime
-from llm_utils import generate_response
+from llm_utils import generate_response, cached_generate_response
 from state import VideoState
-from prompts import get_image_prompts_prompt
+from prompts import get_image_prompts_prompt, get_script_prompt
+
+# orjson is optional, it parses the LLM replies a few times faster
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 # Set ImageMagick Path
 change_settings({"IMAGEMAGICK_BINARY": get_imagemagick_path()})
 
+# Patterns used to clean up LLM responses
+_STAR_RE = re.compile(r"\*")
+_SCRIPT_CLEAN_RE = re.compile(r"[^\w\s.?!]")
+
+# Same filter as _SCRIPT_CLEAN_RE as a translation table, for the common case of ASCII scripts
+_SCRIPT_CLEAN_TABLE = {
+    code: None for code in range(128)
+    if not (chr(code).isalnum() or chr(code).isspace() or chr(code) in "_.?!")
+}
+
+# Limits for generated scripts, max tokens keeps the model close to the length limit
+_SCRIPT_MAX_LENGTH = 5000
+_SCRIPT_MAX_ATTEMPTS = 3
+_SCRIPT_MAX_TOKENS = 1200
+
+# Attempts for a G4F image generation, waiting exponentially longer (with jitter) in between
+_IMAGE_MAX_ATTEMPTS = 3
+_IMAGE_RETRY_DELAY = 2.0
+
+# Create an unverified SSL context for requests, once for the whole process
+ssl._create_default_https_context = ssl._create_unverified_context
+
+# G4F image client, created on first use and shared by all image generations
+_g4f_client = None
+_g4f_client_lock = threading.Lock()
+
+# AssemblyAI transcriber, created on first use so assemblyai is only imported when transcribing
+_transcriber = None
+
+# Shared HTTP session, keeps connections alive across image downloads
+# and retries transient failures instead of sleeping between attempts
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504]
+    )
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# ASS style for subtitles burned in by ffmpeg, matching the MoviePy TextClip look.
+# libass scales sizes from a 288px high canvas, so 15 is roughly 100px at 1920px.
+_SUBTITLE_STYLE = "FontName={font},FontSize=15,PrimaryColour=&H0000FFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=1,Shadow=0,Alignment=5"
+
+# H.264 encoders in order of preference with the preset to use for each,
+# hardware encoders move the encoding off the CPU entirely
+_VIDEO_ENCODERS = [
+    ("h264_nvenc", "p4"),
+    ("h264_qsv", "veryfast"),
+    ("h264_videotoolbox", None),
+    ("libx264", "veryfast"),
+]
+_VIDEO_BITRATE_PARAMS = ["-b:v", "5M", "-maxrate", "6M", "-bufsize", "10M"]
+
+@functools.lru_cache(maxsize=None)
+def _get_video_encoder() -> Tuple[str, str]:
+    """
+    Detects the best available H.264 encoder.
+    Encoders listed by ffmpeg are probed with a single frame,
+    since being compiled in does not mean the hardware is present.
+
+    Returns:
+        encoder (Tuple[str, str]): The codec and the preset to use with it.
+    """
+    ffmpeg = get_setting("FFMPEG_BINARY")
+    try:
+        listed = subprocess.run([ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    except OSError:
+        return _VIDEO_ENCODERS[-1]
+
+    for codec, preset in _VIDEO_ENCODERS[:-1]:
+        if codec not in listed:
+            continue
+        probe = [ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                 "-i", "color=size=256x256", "-frames:v", "1", "-c:v", codec]
+        if preset:
+            probe += ["-preset", preset]
+        if subprocess.run(probe + ["-f", "null", "-"], capture_output=True).returncode == 0:
+            if get_verbose():
+                info(f" => Using hardware video encoder: {codec}")
+            return codec, preset
+
+    return _VIDEO_ENCODERS[-1]
+
+# Characters per subtitle line, about what fits 1080px at the 100px subtitle font size
+_SUBTITLE_WRAP_WIDTH = 18
+
+def _get_g4f_client():
+    """
+    Gets the shared G4F client, creating it on first use.
+
+    Returns:
+        client (g4f.client.Client): The G4F client.
+    """
+    global _g4f_client
+    with _g4f_client_lock:
+        if _g4f_client is None:
+            from g4f.client import Client
+
+            _g4f_client = Client()
+    return _g4f_client
+
+def _get_transcriber():
+    """
+    Gets the shared AssemblyAI transcriber, creating it on first use.
+
+    Returns:
+        transcriber (assemblyai.Transcriber): The AssemblyAI transcriber.
+    """
+    global _transcriber
+    if _transcriber is None:
+        import assemblyai as aai
+
+        aai.settings.api_key = get_assemblyai_api_key()
+        _transcriber = aai.Transcriber(config=aai.TranscriptionConfig())
+    return _transcriber
+
+def _escape_concat_path(path: str) -> str:
+    """
+    Escapes a path for use in an ffmpeg concat demuxer script.
+
+    Args:
+        path (str): The path to escape.
+
+    Returns:
+        path (str): The escaped path.
+    """
+    return os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+
+def _concat_entry(path: str, duration: float) -> str:
+    """
+    Builds one entry of an ffmpeg concat demuxer script.
+
+    Args:
+        path (str): The path to the image.
+        duration (float): How long to show the image, in seconds.
+
+    Returns:
+        entry (str): The concat script entry.
+    """
+    return f"file '{_escape_concat_path(path)}'\nduration {duration:.3f}\n"
+
+def _escape_filter_path(path: str) -> str:
+    """
+    Escapes a path for use as a quoted option value in an ffmpeg filtergraph.
+
+    Args:
+        path (str): The path to escape.
+
+    Returns:
+        path (str): The escaped path.
+    """
+    return os.path.abspath(path).replace("\\", "/").replace(":", "\\:")
+
+def _stream_to_file(response: requests.Response, path: str) -> None:
+    """
+    Streams the body of a response straight to disk,
+    without holding the whole file in memory.
+    A partially written file is removed if the download fails.
+
+    Args:
+        response (requests.Response): A response requested with stream=True.
+        path (str): Where to write the body.
+
+    Returns:
+        None
+    """
+    try:
+        with open(path, "wb") as file:
+            # Write each chunk as it arrives, so no more than one chunk is held in memory
+            for chunk in response.raw.stream(64 * 1024, decode_content=True):
+                file.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+def _fit_image(image_path: str) -> Image.Image:
+    """
+    Loads an image, center-cropped to 9:16 and resized to 1080x1920.
+
+    Args:
+        image_path (str): The path to the image.
+
+    Returns:
+        image (Image.Image): The fitted RGB image.
+    """
+    image = Image.open(image_path).convert("RGB")
+    w, h = image.size
+
+    # Not all images are same size, so we need to crop them
+    # to 9:16 and resize them, in one pass on the decoded pixels
+    if round((w/h), 4) < 0.5625:
+        if get_verbose():
+            info(f" => Resizing Image: {image_path} to 1080x1920")
+        new_h = round(w/0.5625)
+        image = image.crop((0, (h - new_h) // 2, w, (h + new_h) // 2))
+    else:
+        if get_verbose():
+            info(f" => Resizing Image: {image_path} to 1920x1080")
+        new_w = round(0.5625*h)
+        image = image.crop(((w - new_w) // 2, 0, (w + new_w) // 2, h))
+    return image.resize((1080, 1920), Image.LANCZOS)
+
+def _render_subtitle(text: str, font: ImageFont.FreeTypeFont) -> ImageClip:
+    """
+    Renders a subtitle cue with PIL into a transparent clip,
+    sized to fit the text. Long cues are wrapped to fit the 1080px wide video.
+
+    Args:
+        text (str): The text of the cue.
+        font (ImageFont.FreeTypeFont): The font to render the text with.
+
+    Returns:
+        clip (ImageClip): The rendered cue, with a mask from its alpha channel.
+    """
+    text = textwrap.fill(text, _SUBTITLE_WRAP_WIDTH)
+    box = ImageDraw.Draw(Image.new("RGBA", (1, 1))).multiline_textbbox(
+        (0, 0), text, font=font, stroke_width=5, align="center"
+    )
+    image = Image.new("RGBA", (max(box[2] - box[0], 1), max(box[3] - box[1], 1)), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text(
+        (-box[0], -box[1]),
+        text,
+        font=font,
+        fill="#FFFF00",
+        stroke_width=5,
+        stroke_fill="black",
+        align="center"
+    )
+
+    return ImageClip(np.array(image), transparent=True)
+
+def _overlay_subtitles(clip: VideoClip, subtitles: SubtitlesClip) -> VideoClip:
+    """
+    Burns subtitles into a clip using PIL alpha compositing,
+    instead of the per-frame numpy blitting of CompositeVideoClip.
+
+    Args:
+        clip (VideoClip): The clip to burn the subtitles into.
+        subtitles (SubtitlesClip): The subtitles, centered on the clip.
+
+    Returns:
+        clip (VideoClip): The clip with the subtitles burned in.
+    """
+    def burn(get_frame, t):
+        frame = get_frame(t)
+        mask = subtitles.mask.get_frame(t)
+
+        # No cue is shown at this time
+        if not mask.any():
+            return frame
+
+        text = np.dstack([subtitles.get_frame(t), mask * 255]).astype("uint8")
+        overlay = Image.fromarray(text, "RGBA")
+        base = Image.fromarray(frame.astype("uint8")).convert("RGBA")
+        base.alpha_composite(overlay, dest=(
+            max((base.width - overlay.width) // 2, 0),
+            max((base.height - overlay.height) // 2, 0)
+        ))
+
+        return np.asarray(base.convert("RGB"))
+
+    return clip.fl(burn)
+
 class Video:
     """
     Class for Video Generation.
@@ -59,14 +342,22 @@ class Video:
         self._niche: str = niche
         self._language: str = language
         self.images = []
+        self._subtitle_future = None
         
         # Initialize state management
         self.state_manager = VideoState()
         self.session_id = session_id or self.state_manager.create_video_session(niche, language)
+
+        # Pick up images recorded in the image log by an interrupted run
+        if session_id:
+            self.state_manager.fold_image_paths(session_id)
+
+        # Keep a reference to the session, the state manager updates it in place
+        self._session_cache = self.state_manager.get_session(self.session_id)
         
         # If resuming from existing session, load saved data
         if session_id:
-            session = self.state_manager.get_session(session_id)
+            session = self._session_cache
             if session and session["data"]:
                 if "topic" in session["data"]:
                     self.subject = session["data"]["topic"]["subject"]
@@ -109,7 +400,7 @@ class Video:
             topic (str): The generated topic.
         """
         # Check if we already have a topic from a previous session
-        session = self.state_manager.get_session(self.session_id)
+        session = self._session_cache
         if session and "topic" in session["data"]:
             self.subject = session["data"]["topic"]["subject"]
             return self.subject
@@ -138,48 +429,45 @@ class Video:
             script (str): The script of the video.
         """
         # Check if we already have a script from a previous session
-        session = self.state_manager.get_session(self.session_id)
+        session = self._session_cache
         if session and "script" in session["data"]:
             self.script = session["data"]["script"]["content"]
             return self.script
 
-        sentence_length = get_script_sentence_length()
-        prompt = f"""
-        Generate a script for a video in {sentence_length} sentences, depending on the subject of the video.
-
-        The script is to be returned as a string with the specified number of paragraphs.
-
-        Here is an example of a string:
-        "This is an example string."
+        prompt = get_script_prompt(
+            sentence_length=get_script_sentence_length(),
+            subject=self.subject,
+            language=self.language
+        )
 
-        Do not under any circumstance reference this prompt in your response.
+        # Retry a bounded amount of times, telling the model how long its previous reply was
+        completion = ""
+        for attempt in range(_SCRIPT_MAX_ATTEMPTS):
+            if attempt > 0:
+                if get_verbose():
+                    warning("Generated Script is too long. Retrying...")
+                request = prompt + f"\n\nYour previous reply had {len(completion)} characters. Keep it under {_SCRIPT_MAX_LENGTH} characters."
+            else:
+                request = prompt
 
-        Get straight to the point, don't start with unnecessary things like, "welcome to this video".
+            # A retry means the cached reply was rejected, so generate a fresh one
+            completion = cached_generate_response(request, refresh=attempt > 0, max_tokens=_SCRIPT_MAX_TOKENS)
 
-        Obviously, the script should be related to the subject of the video.
-        
-        YOU MUST NOT EXCEED THE {sentence_length} SENTENCES LIMIT. MAKE SURE THE {sentence_length} SENTENCES ARE SHORT.
-        YOU MUST NOT INCLUDE ANY TYPE OF MARKDOWN OR FORMATTING IN THE SCRIPT, NEVER USE A TITLE.
-        YOU MUST WRITE THE SCRIPT IN THE LANGUAGE SPECIFIED IN [LANGUAGE].
-        ONLY RETURN THE RAW CONTENT OF THE SCRIPT. DO NOT INCLUDE "VOICEOVER", "NARRATOR" OR SIMILAR INDICATORS OF WHAT SHOULD BE SPOKEN AT THE BEGINNING OF EACH PARAGRAPH OR LINE. YOU MUST NOT MENTION THE PROMPT, OR ANYTHING ABOUT THE SCRIPT ITSELF. ALSO, NEVER TALK ABOUT THE AMOUNT OF PARAGRAPHS OR LINES. JUST WRITE THE SCRIPT
-        
-        Subject: {self.subject}
-        Language: {self.language}
-        """
-        completion = generate_response(prompt)
+            # Apply regex to remove *
+            completion = _STAR_RE.sub("", completion or "")
 
-        # Apply regex to remove *
-        completion = re.sub(r"\*", "", completion)
+            if len(completion) <= _SCRIPT_MAX_LENGTH:
+                break
         
         if not completion:
             error("The generated script is empty.")
             self.state_manager.mark_failed(self.session_id, "Failed to generate script")
             return None
         
-        if len(completion) > 5000:
-            if get_verbose():
-                warning("Generated Script is too long. Retrying...")
-            return self.generate_script()
+        if len(completion) > _SCRIPT_MAX_LENGTH:
+            error("The generated script is too long.")
+            self.state_manager.mark_failed(self.session_id, "Generated script is too long")
+            return None
         
         self.script = completion
         
@@ -198,19 +486,21 @@ class Video:
             metadata (dict): The generated metadata.
         """
         # Check if we already have metadata from a previous session
-        session = self.state_manager.get_session(self.session_id)
+        session = self._session_cache
         if session and "metadata" in session["data"]:
             self.metadata = session["data"]["metadata"]
             return self.metadata
 
-        title = generate_response(f"Please generate a Video Title for the following subject, including hashtags: {self.subject}. Only return the title, nothing else. Limit the title under 100 characters.")
+        title_prompt = f"Please generate a Video Title for the following subject, including hashtags: {self.subject}. Only return the title, nothing else. Limit the title under 100 characters."
+        title = cached_generate_response(title_prompt)
 
-        if len(title) > 100:
+        # Ask for a fresh title, the cached one would be rejected again
+        while len(title) > 100:
             if get_verbose():
                 warning("Generated Title is too long. Retrying...")
-            return self.generate_metadata()
+            title = cached_generate_response(title_prompt, refresh=True)
 
-        description = generate_response(f"Please generate a Video Description for the following script: {self.script}. Only return the description, nothing else.")
+        description = cached_generate_response(f"Please generate a Video Description for the following script: {self.script}. Only return the description, nothing else.")
         
         self.metadata = {
             "title": title,
@@ -222,15 +512,18 @@ class Video:
 
         return self.metadata
     
-    def generate_prompts(self) -> List[str]:
+    def generate_prompts(self, refresh: bool = False) -> List[str]:
         """
         Generates AI Image Prompts based on the provided Video Script.
 
+        Args:
+            refresh (bool, optional): Ignore a cached LLM response for the same prompt. Defaults to False.
+
         Returns:
             image_prompts (List[str]): Generated List of image prompts.
         """
         # Check if we already have prompts from a previous session
-        session = self.state_manager.get_session(self.session_id)
+        session = self._session_cache
         if session and "image_prompts" in session["data"]:
             self.image_prompts = session["data"]["image_prompts"]["prompts"]
             return self.image_prompts
@@ -251,30 +544,34 @@ class Video:
             script=self.script
         )
 
-        completion = str(generate_response(prompt, model=parse_model(get_image_prompt_llm())))\
+        completion = str(cached_generate_response(prompt, model=parse_model(get_image_prompt_llm()), refresh=refresh))\
             .replace("```json", "") \
             .replace("```", "")
 
         image_prompts = []
 
         if "image_prompts" in completion:
-            image_prompts = json.loads(completion)["image_prompts"]
+            image_prompts = _json_loads(completion)["image_prompts"]
         else:
             try:
-                image_prompts = json.loads(completion)
+                image_prompts = _json_loads(completion)
                 if get_verbose():
                     info(f" => Generated Image Prompts: {image_prompts}")
             except Exception:
                 if get_verbose():
                     warning("GPT returned an unformatted response. Attempting to clean...")
 
-                # Get everything between [ and ], and turn it into a list
-                r = re.compile(r"\[.*\]")
-                image_prompts = r.findall(completion)
+                # Get everything between the first [ and the last ], and turn it into a list
+                start = completion.find("[")
+                end = completion.rfind("]")
+                try:
+                    image_prompts = _json_loads(completion[start:end + 1]) if start >= 0 and end > start else []
+                except ValueError:
+                    image_prompts = []
                 if len(image_prompts) == 0:
                     if get_verbose():
                         warning("Failed to generate Image Prompts. Retrying...")
-                    return self.generate_prompts()
+                    return self.generate_prompts(refresh=True)
 
         # Limit prompts to max allowed amount
         if self.useG4F:
@@ -293,100 +590,92 @@ class Video:
 
         return image_prompts
 
-    def generate_image_g4f(self, prompt: str, max_retries: int = 3) -> str:
+    def generate_image_g4f(self, prompt: str, max_retries: int = _IMAGE_MAX_ATTEMPTS, persist: bool = True) -> str:
         """
         Generates an AI Image using G4F with SDXL Turbo.
 
         Args:
             prompt (str): Reference for image generation
-            max_retries (int, optional): Maximum number of retry attempts. Defaults to 3.
+            max_retries (int, optional): Maximum number of generation attempts. Defaults to 3.
+            persist (bool, optional): Whether to record the image in the session state. Defaults to True.
 
         Returns:
             path (str): The path to the generated image.
         """
         print(f"Generating Image using G4F: {prompt}")
         
-        # Create an unverified SSL context for requests
-        ssl._create_default_https_context = ssl._create_unverified_context
-        
+        # The generation itself is flaky, retry it with backoff
+        response = None
         for attempt in range(max_retries):
             try:
-                from g4f.client import Client
-                
-                client = Client()
-                response = client.images.generate(
+                response = _get_g4f_client().images.generate(
                     model="sdxl-turbo",
                     prompt=prompt,
                     response_format="url",
                     timeout=60
                 )
-                
                 if response and response.data and len(response.data) > 0:
-                    # Download image from URL
-                    image_url = response.data[0].url
-                    
-                    try:
-                        image_response = requests.get(image_url, verify=False, timeout=30)
-                        
-                        if image_response.status_code == 200:
-                            # Generate a unique filename
-                            image_filename = f"{str(uuid4())}.png"
-                            
-                            # Save in temporary directory for video processing
-                            temp_path = os.path.join(ROOT_DIR, ".mp", image_filename)
-                            with open(temp_path, "wb") as image_file:
-                                image_file.write(image_response.content)
-                            
-                            # Save in permanent images directory
-                            permanent_path = os.path.join(ROOT_DIR, "images", image_filename)
-                            with open(permanent_path, "wb") as image_file:
-                                image_file.write(image_response.content)
-                            
-                            if get_verbose():
-                                info(f" => Downloaded Image from {image_url}")
-                                info(f" => Saved temporarily to: {temp_path}")
-                                info(f" => Saved permanently to: {permanent_path}\n")
-                            
-                            self.images.append(temp_path)
-                            
-                            # Save the generated image path
-                            session = self.state_manager.get_session(self.session_id)
-                            current_paths = session["data"].get("images", {}).get("paths", []) if session else []
-                            current_paths.append(temp_path)
-                            self.state_manager.save_step_result(self.session_id, "images", {
-                                "paths": current_paths
-                            })
-                            
-                            return temp_path
-                        else:
-                            if get_verbose():
-                                warning(f"Failed to download image from URL: {image_url} (Status: {image_response.status_code})")
-                    except requests.exceptions.RequestException as e:
-                        if get_verbose():
-                            warning(f"Failed to download image: {str(e)}")
-                else:
-                    if get_verbose():
-                        warning("Failed to generate image using G4F - no data in response")
-                    
+                    break
+                if get_verbose():
+                    warning("Failed to generate image using G4F - no data in response")
             except Exception as e:
                 if get_verbose():
                     warning(f"Failed to generate image using G4F: {str(e)}")
-            
+            response = None
+
             if attempt < max_retries - 1:
+                delay = _IMAGE_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
                 if get_verbose():
-                    warning(f"Image generation attempt {attempt + 1} failed, retrying in 5 seconds...")
-                time.sleep(5)
-                
-        error("Failed to generate image after maximum retries")
-        return None
+                    warning(f"Image generation attempt {attempt + 1} failed, retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+
+        if response is None:
+            error("Failed to generate image after maximum retries")
+            return None
+
+        # Download image from URL, transient failures are retried by the session adapter
+        image_url = response.data[0].url
+
+        # Generate a unique filename
+        image_filename = f"{str(uuid4())}.png"
+        temp_path = os.path.join(ROOT_DIR, ".mp", image_filename)
 
-    def generate_image_cloudflare(self, prompt: str, worker_url: str) -> str:
+        # Stream into temporary directory for video processing
+        try:
+            with _SESSION.get(image_url, stream=True, verify=False, timeout=30) as image_response:
+                if image_response.status_code != 200:
+                    error(f"Failed to download image from URL: {image_url} (Status: {image_response.status_code})")
+                    return None
+                _stream_to_file(image_response, temp_path)
+        except (requests.exceptions.RequestException, UrllibHTTPError) as e:
+            error(f"Failed to download image: {str(e)}")
+            return None
+        
+        # Link into permanent images directory
+        permanent_path = os.path.join(ROOT_DIR, "images", image_filename)
+        link_or_copy(temp_path, permanent_path)
+        
+        if get_verbose():
+            info(f" => Downloaded Image from {image_url}")
+            info(f" => Saved temporarily to: {temp_path}")
+            info(f" => Saved permanently to: {permanent_path}\n")
+        
+        if persist:
+            self.images.append(temp_path)
+
+            # Record the generated image path
+            self.state_manager.append_image_path(self.session_id, temp_path, prompt)
+        
+        return temp_path
+
+    def generate_image_cloudflare(self, prompt: str, worker_url: str, persist: bool = True) -> str:
         """
         Generates an AI Image using Cloudflare worker.
 
         Args:
             prompt (str): Reference for image generation
             worker_url (str): The Cloudflare worker URL
+            persist (bool, optional): Whether to record the image in the session state. Defaults to True.
 
         Returns:
             path (str): The path to the generated image.
@@ -395,28 +684,36 @@ class Video:
 
         url = f"{worker_url}?prompt={prompt}&model=sdxl"
         
-        response = requests.get(url)
+        # Generate a unique filename
+        image_filename = f"{str(uuid4())}.png"
+        temp_path = os.path.join(ROOT_DIR, ".mp", image_filename)
+
+        # Stream into temporary directory for video processing,
+        # the body is only read once the headers say it is a PNG
+        try:
+            with _SESSION.get(url, stream=True) as response:
+                is_png = response.headers.get('content-type') == 'image/png'
+                if is_png:
+                    _stream_to_file(response, temp_path)
+        except (requests.exceptions.RequestException, UrllibHTTPError) as e:
+            error(f"Failed to download image: {str(e)}")
+            return None
         
-        if response.headers.get('content-type') == 'image/png':
-            # Generate a unique filename
-            image_filename = f"{str(uuid4())}.png"
-            
-            # Save in temporary directory for video processing
-            temp_path = os.path.join(ROOT_DIR, ".mp", image_filename)
-            with open(temp_path, "wb") as image_file:
-                image_file.write(response.content)
-            
-            # Save in permanent images directory
+        if is_png:
+            # Link into permanent images directory
             permanent_path = os.path.join(ROOT_DIR, "images", image_filename)
-            with open(permanent_path, "wb") as image_file:
-                image_file.write(response.content)
+            link_or_copy(temp_path, permanent_path)
             
             if get_verbose():
                 info(f" => Generated Image from Cloudflare")
                 info(f" => Saved temporarily to: {temp_path}")
                 info(f" => Saved permanently to: {permanent_path}\n")
             
-            self.images.append(temp_path)
+            if persist:
+                self.images.append(temp_path)
+
+                # Record the generated image path
+                self.state_manager.append_image_path(self.session_id, temp_path, prompt)
             
             return temp_path
         else:
@@ -424,12 +721,13 @@ class Video:
                 warning("Failed to generate image. The response was not a PNG image.")
             return None
 
-    def generate_image(self, prompt: str) -> str:
+    def generate_image(self, prompt: str, persist: bool = True) -> str:
         """
         Generates an AI Image based on the given prompt.
 
         Args:
             prompt (str): Reference for image generation
+            persist (bool, optional): Whether to record the image in the session state. Defaults to True.
 
         Returns:
             path (str): The path to the generated image.
@@ -437,13 +735,13 @@ class Video:
 
         # Check if using G4F or Cloudflare
         if self.useG4F:
-            return self.generate_image_g4f(prompt)
+            return self.generate_image_g4f(prompt, persist=persist)
         else:
             worker_url = account_config.get("worker_url")
             if not worker_url:
                 error("Cloudflare worker URL not configured for this account")
                 return None
-            return self.generate_image_cloudflare(prompt, worker_url)
+            return self.generate_image_cloudflare(prompt, worker_url, persist=persist)
 
     def generate_script_to_speech(self, tts_instance: TTS) -> str:
         """
@@ -456,7 +754,7 @@ class Video:
             path_to_wav (str): Path to generated audio (WAV Format).
         """
         # Check if we already have TTS from a previous session
-        session = self.state_manager.get_session(self.session_id)
+        session = self._session_cache
         if session and "tts" in session["data"]:
             self.tts_path = session["data"]["tts"]["path"]
             return self.tts_path
@@ -464,7 +762,10 @@ class Video:
         path = os.path.join(ROOT_DIR, ".mp", str(uuid4()) + ".wav")
 
         # Clean script, remove every character that is not a word character, a space, a period, a question mark, or an exclamation mark.
-        self.script = re.sub(r'[^\w\s.?!]', '', self.script)
+        if self.script.isascii():
+            self.script = self.script.translate(_SCRIPT_CLEAN_TABLE)
+        else:
+            self.script = _SCRIPT_CLEAN_RE.sub("", self.script)
 
         tts_instance.synthesize(self.script, path)
 
@@ -491,10 +792,7 @@ class Video:
             path (str): The path to the generated SRT File.
         """
         # Turn the video into audio
-        aai.settings.api_key = get_assemblyai_api_key()
-        config = aai.TranscriptionConfig()
-        transcriber = aai.Transcriber(config=config)
-        transcript = transcriber.transcribe(audio_path)
+        transcript = _get_transcriber().transcribe(audio_path)
         subtitles = transcript.export_subtitles_srt()
 
         srt_path = os.path.join(ROOT_DIR, ".mp", str(uuid4()) + ".srt")
@@ -504,126 +802,202 @@ class Video:
 
         return srt_path
 
-    def combine(self) -> str:
+    def _render_with_ffmpeg(self, images: List[str], duration: float, subtitles_path: str, song_path: str, output_path: str, threads: int, codec: str, preset: str) -> bool:
         """
-        Combines everything into the final video.
+        Renders the final video with a single ffmpeg call.
+        Images are fitted to 1080x1920 first, as the concat demuxer drops frames
+        of images whose resolution differs from the first one. They are fed through
+        the concat demuxer, subtitles are burned in with the subtitles filter and the
+        background song is mixed in with amix.
+
+        Args:
+            images (List[str]): Paths to the images to show, in order.
+            duration (float): The duration of the video (length of the TTS).
+            subtitles_path (str): Path to the SRT File.
+            song_path (str): Path to the background song, or None.
+            output_path (str): Where to write the MP4 File.
+            threads (int): Amount of threads for the encoder.
+            codec (str): The video encoder to use.
+            preset (str): The encoder preset, or None.
 
         Returns:
-            path (str): The path to the generated MP4 File.
+            success (bool): Whether ffmpeg wrote the video.
         """
-        combined_image_path = os.path.join(ROOT_DIR, ".mp", str(uuid4()) + ".mp4")
-        threads = get_threads()
-        tts_clip = AudioFileClip(self.tts_path)
-        max_duration = tts_clip.duration
-        
-        # Filter out invalid image paths
-        valid_images = []
-        for image_path in self.images:
-            if not os.path.exists(image_path):
+        if duration <= 0:
+            return False
+
+        # Fit every image to the output size, images that cannot be loaded are skipped
+        fitted = []
+        for image_path in images:
+            fitted_path = os.path.join(ROOT_DIR, ".mp", str(uuid4()) + ".png")
+            try:
+                _fit_image(image_path).save(fitted_path, compress_level=1)
+            except Exception as e:
                 if get_verbose():
-                    warning(f"Image not found, skipping: {image_path}")
+                    warning(f"Failed to prepare image {image_path}: {str(e)}")
                 continue
+            fitted.append(fitted_path)
+
+        concat_path = os.path.join(ROOT_DIR, ".mp", str(uuid4()) + ".txt")
+        try:
+            return self._run_ffmpeg_render(fitted, duration, concat_path, subtitles_path, song_path, output_path, threads, codec, preset)
+        finally:
+            for fitted_path in fitted:
+                os.remove(fitted_path)
+
+    def _run_ffmpeg_render(self, images: List[str], duration: float, concat_path: str, subtitles_path: str, song_path: str, output_path: str, threads: int, codec: str, preset: str) -> bool:
+        """
+        Writes the concat list of the fitted images and runs ffmpeg, see _render_with_ffmpeg.
+
+        Args:
+            images (List[str]): Paths to the fitted 1080x1920 images, in order.
+            duration (float): The duration of the video (length of the TTS).
+            concat_path (str): Where to write the concat list.
+            subtitles_path (str): Path to the SRT File.
+            song_path (str): Path to the background song, or None.
+            output_path (str): Where to write the MP4 File.
+            threads (int): Amount of threads for the encoder.
+            codec (str): The video encoder to use.
+            preset (str): The encoder preset, or None.
+
+        Returns:
+            success (bool): Whether ffmpeg wrote the video.
+        """
+        if not images:
+            return False
+
+        req_dur = duration / len(images)
+
+        # Cycle the images until the duration of the audio has been reached.
+        # The concat demuxer ignores the duration of the last entry unless it is repeated.
+        entries = []
+        tot_dur = 0
+        while tot_dur < duration:
+            image_path = images[len(entries) % len(images)]
+            entries.append(_concat_entry(image_path, req_dur))
+            tot_dur += req_dur
+        entries.append(f"file '{_escape_concat_path(image_path)}'\n")
+
+        with open(concat_path, "w") as file:
+            file.write("".join(entries))
+
+        font_path = os.path.join(get_fonts_dir(), get_font())
+        style = _SUBTITLE_STYLE.format(font=ImageFont.truetype(font_path).getname()[0])
+        video_filter = (
+            "[0:v]setsar=1,fps=30,"
+            f"subtitles=filename='{_escape_filter_path(subtitles_path)}'"
+            f":fontsdir='{_escape_filter_path(get_fonts_dir())}'"
+            f":force_style='{style}',format=yuv420p[v]"
+        )
+
+        command = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+                   "-f", "concat", "-safe", "0", "-i", concat_path,
+                   "-i", self.tts_path]
+
+        if song_path:
+            command += ["-i", song_path, "-filter_complex",
+                        f"{video_filter};[2:a]volume=0.1[bg];[1:a][bg]amix=inputs=2:duration=first:normalize=0[a]",
+                        "-map", "[v]", "-map", "[a]"]
+        else:
+            command += ["-filter_complex", video_filter, "-map", "[v]", "-map", "1:a"]
+
+        command += ["-c:v", codec]
+        if preset:
+            command += ["-preset", preset]
+        command += _VIDEO_BITRATE_PARAMS + ["-threads", str(threads),
+                    "-c:a", "aac", "-t", f"{duration:.3f}", output_path]
+
+        try:
+            result = subprocess.run(command, capture_output=True, text=True)
+        except OSError as e:
+            if get_verbose():
+                warning(f"Failed to run ffmpeg: {str(e)}")
+            return False
+        finally:
+            os.remove(concat_path)
+
+        if result.returncode != 0:
+            if get_verbose():
+                warning(f"ffmpeg exited with code {result.returncode}: {result.stderr.strip()}")
+            return False
+
+        return True
+
+    def _render_with_moviepy(self, images: List[str], tts_clip: AudioFileClip, subtitles_path: str, song_path: str, output_path: str, threads: int, codec: str, preset: str) -> bool:
+        """
+        Renders the final video with MoviePy.
+        Used as a fallback when ffmpeg could not render the video directly.
+
+        Args:
+            images (List[str]): Paths to the images to show, in order.
+            tts_clip (AudioFileClip): The TTS audio.
+            subtitles_path (str): Path to the SRT File.
+            song_path (str): Path to the background song, or None.
+            output_path (str): Where to write the MP4 File.
+            threads (int): Amount of threads for MoviePy.
+            codec (str): The video encoder to use.
+            preset (str): The encoder preset, or None for "medium".
+
+        Returns:
+            success (bool): Whether the video was written.
+        """
+        max_duration = tts_clip.duration
+
+        # Decode, crop and resize every image exactly once.
+        # Images that cannot be loaded are skipped.
+        prepared_clips = []
+        for image_path in images:
             try:
-                # Try to create the clip to validate the image
-                test_clip = ImageClip(image_path)
-                valid_images.append(image_path)
+                clip = ImageClip(np.asarray(_fit_image(image_path))).set_fps(30)
+
+                # FX (Fade In)
+                #clip = clip.fadein(2)
+
+                prepared_clips.append(clip)
             except Exception as e:
                 if get_verbose():
                     warning(f"Failed to create clip for image {image_path}: {str(e)}")
                 continue
-        
-        if not valid_images:
-            error("No valid images found to create video")
-            self.state_manager.mark_failed(self.session_id, "No valid images found to create video")
-            return None
-            
-        req_dur = max_duration / len(valid_images)
-
-        # Make a generator that returns a TextClip when called with consecutive
-        generator = lambda txt: TextClip(
-            txt,
-            font=os.path.join(get_fonts_dir(), get_font()),
-            fontsize=100,
-            color="#FFFF00",
-            stroke_color="black",
-            stroke_width=5,
-            size=(1080, 1920),
-            method="caption",
-        )
 
-        print(colored("[+] Combining images...", "blue"))
+        if not prepared_clips:
+            error("Failed to create any valid video clips")
+            self.state_manager.mark_failed(self.session_id, "Failed to create any valid video clips")
+            return False
+
+        req_dur = max_duration / len(prepared_clips)
+
+        # Make a generator that returns a subtitle clip when called with consecutive
+        # cues, the font is loaded once instead of launching ImageMagick per cue
+        font = ImageFont.truetype(os.path.join(get_fonts_dir(), get_font()), 100)
+        generator = lambda txt: _render_subtitle(txt, font)
 
         clips = []
         tot_dur = 0
-        # Add downloaded clips over and over until the duration of the audio (max_duration) has been reached
+        # Cycle the prepared clips until the duration of the audio (max_duration) has been reached.
+        # set_duration returns a shallow copy, so every cycle shares the decoded frame of its image.
         while tot_dur < max_duration:
-            for image_path in valid_images:
-                try:
-                    clip = ImageClip(image_path)
-                    clip.duration = req_dur
-                    clip = clip.set_fps(30)
-
-                    # Not all images are same size,
-                    # so we need to resize them
-                    if round((clip.w/clip.h), 4) < 0.5625:
-                        if get_verbose():
-                            info(f" => Resizing Image: {image_path} to 1080x1920")
-                        clip = crop(clip, width=clip.w, height=round(clip.w/0.5625), \
-                                    x_center=clip.w / 2, \
-                                    y_center=clip.h / 2)
-                    else:
-                        if get_verbose():
-                            info(f" => Resizing Image: {image_path} to 1920x1080")
-                        clip = crop(clip, width=round(0.5625*clip.h), height=clip.h, \
-                                    x_center=clip.w / 2, \
-                                    y_center=clip.h / 2)
-                    clip = clip.resize((1080, 1920))
-
-                    # FX (Fade In)
-                    #clip = clip.fadein(2)
-
-                    clips.append(clip)
-                    tot_dur += clip.duration
-                except Exception as e:
-                    if get_verbose():
-                        warning(f"Failed to process image {image_path}: {str(e)}")
-                    continue
-
-        if not clips:
-            error("Failed to create any valid video clips")
-            self.state_manager.mark_failed(self.session_id, "Failed to create any valid video clips")
-            return None
+            clips.append(prepared_clips[len(clips) % len(prepared_clips)].set_duration(req_dur))
+            tot_dur += req_dur
 
         final_clip = concatenate_videoclips(clips)
         final_clip = final_clip.set_fps(30)
         
-        # Get a random background song
-        random_song = choose_random_song()
-        
-        subtitles_path = self.generate_subtitles(self.tts_path)
-
-        # Equalize srt file
-        equalize_subtitles(subtitles_path, 10)
-        
         # Burn the subtitles into the video
         subtitles = SubtitlesClip(subtitles_path, generator)
-        subtitles.set_pos(("center", "center"))
 
         # Create audio composition
         audio_clips = [tts_clip.set_fps(44100)]
         
         # Add background music if a valid song was found
-        if random_song:
+        if song_path:
             try:
-                random_song_clip = AudioFileClip(random_song).set_fps(44100)
+                random_song_clip = AudioFileClip(song_path).set_fps(44100)
                 # Turn down volume
                 random_song_clip = random_song_clip.fx(afx.volumex, 0.1)
                 audio_clips.append(random_song_clip)
             except Exception as e:
                 if get_verbose():
                     warning(f"Failed to load background song: {str(e)}")
-        elif get_verbose():
-            warning("No valid background song found, continuing without background music")
             
         comp_audio = CompositeAudioClip(audio_clips)
 
@@ -631,17 +1005,86 @@ class Video:
         final_clip = final_clip.set_duration(tts_clip.duration)
 
         # Add subtitles
-        final_clip = CompositeVideoClip([
-            final_clip,
-            subtitles
-        ])
+        final_clip = _overlay_subtitles(final_clip, subtitles)
+
+        final_clip.write_videofile(
+            output_path,
+            codec=codec,
+            preset=preset or "medium",
+            threads=threads,
+            ffmpeg_params=_VIDEO_BITRATE_PARAMS
+        )
 
-        final_clip.write_videofile(combined_image_path, threads=threads)
+        return True
+
+    def combine(self) -> str:
+        """
+        Combines everything into the final video.
+
+        Returns:
+            path (str): The path to the generated MP4 File.
+        """
+        combined_image_path = os.path.join(ROOT_DIR, ".mp", str(uuid4()) + ".mp4")
+        threads = get_threads()
+        tts_clip = AudioFileClip(self.tts_path)
+        max_duration = tts_clip.duration
+        
+        # Filter out invalid image paths
+        valid_images = []
+        for image_path in self.images:
+            if not os.path.exists(image_path):
+                if get_verbose():
+                    warning(f"Image not found, skipping: {image_path}")
+                continue
+            try:
+                # Only parse the image header to validate the image
+                with Image.open(image_path) as image:
+                    image.verify()
+                valid_images.append(image_path)
+            except Exception as e:
+                if get_verbose():
+                    warning(f"Failed to load image {image_path}: {str(e)}")
+                continue
+        
+        if not valid_images:
+            error("No valid images found to create video")
+            self.state_manager.mark_failed(self.session_id, "No valid images found to create video")
+            return None
+
+        # Get a random background song
+        random_song = choose_random_song()
+        if not random_song and get_verbose():
+            warning("No valid background song found, continuing without background music")
+        
+        codec, preset = _get_video_encoder()
+        if codec == "libx264":
+            # libx264 barely scales past a few threads at the default count,
+            # so give it every core on top of the faster preset
+            threads = max(threads, 4, os.cpu_count() or 1)
+
+        # Wait for the transcription started by generate_video, or transcribe now
+        if self._subtitle_future:
+            subtitles_path = self._subtitle_future.result()
+            self._subtitle_future = None
+        else:
+            subtitles_path = self.generate_subtitles(self.tts_path)
+
+        # Equalize srt file
+        equalize_subtitles(subtitles_path, 10)
+
+        print(colored("[+] Combining images...", "blue"))
+
+        if not self._render_with_ffmpeg(valid_images, max_duration, subtitles_path, random_song, combined_image_path, threads, codec, preset):
+            warning("Failed to render video with ffmpeg, falling back to MoviePy...")
+            # The probed encoder may be what made ffmpeg fail, and its preset names
+            # differ from x264's, so fall back to software encoding
+            if not self._render_with_moviepy(valid_images, tts_clip, subtitles_path, random_song, combined_image_path, threads, "libx264", None):
+                return None
 
         # Save video to permanent directory
         video_name = os.path.basename(combined_image_path)
         permanent_path = os.path.join(ROOT_DIR, "videos", video_name)
-        shutil.copy2(combined_image_path, permanent_path)
+        link_or_copy(combined_image_path, permanent_path)
         
         if get_verbose():
             success(f"Wrote Video to \"{combined_image_path}\"")
@@ -654,19 +1097,20 @@ class Video:
         
         return permanent_path
 
-    def generate_video(self, tts_instance: TTS) -> str:
+    def generate_video(self, tts_instance: Union[TTS, Future]) -> str:
         """
         Generates a Video based on the provided niche and language.
 
         Args:
-            tts_instance (TTS): Instance of TTS Class.
+            tts_instance (TTS | Future): Instance of TTS Class, or a Future of one that is
+                still loading. It is only waited for once the speech is synthesized.
 
         Returns:
             path (str): The path to the generated MP4 File.
         """
         try:
             # Check if we already have all images from a previous session
-            session = self.state_manager.get_session(self.session_id)
+            session = self._session_cache
             has_all_images = False
             if session and "images" in session["data"]:
                 image_paths = session["data"]["images"].get("paths", [])
@@ -691,20 +1135,55 @@ class Video:
 
             # Generate the Images if not already generated
             if not has_all_images:
-                for prompt in self.image_prompts:
-                    self.generate_image(prompt)
+                # Images of an interrupted run are reused, only the missing prompts are generated
+                # Images are keyed by prompt index, as the same prompt may be used twice
+                generated = {
+                    index: path
+                    for index, path in self.state_manager.fold_image_paths(self.session_id, self.image_prompts).items()
+                    if os.path.exists(path)
+                }
+                missing = [index for index in range(len(self.image_prompts)) if index not in generated]
+                if generated and get_verbose():
+                    info(f" => Reusing {len(generated)} images from previous session")
+
+                def generate(index: int) -> str:
+                    prompt = self.image_prompts[index]
+                    path = self.generate_image(prompt, persist=False)
+                    if path:
+                        # Record every image as soon as it exists
+                        self.state_manager.append_image_path(self.session_id, path, prompt, index)
+                    return path
+
+                # Image generation is bound by network latency, so run the prompts in parallel.
+                # Results keep the order of the prompts, failed generations are dropped.
+                with ThreadPoolExecutor(max_workers=get_image_concurrency()) as executor:
+                    for index, path in zip(missing, executor.map(generate, missing)):
+                        if path:
+                            generated[index] = path
+                self.images = [generated[index] for index in sorted(generated)]
                 
                 # Save state after all images are generated
                 self.state_manager.save_step_result(self.session_id, "images", {
                     "paths": self.images,
+                    "by_index": {
+                        str(index): {"prompt": self.image_prompts[index], "path": path}
+                        for index, path in generated.items()
+                    },
                     "completed": True
                 })
                 if get_verbose():
                     info(f" => Generated and saved {len(self.images)} images")
 
             # Generate the TTS
+            if isinstance(tts_instance, Future):
+                tts_instance = tts_instance.result()
             self.generate_script_to_speech(tts_instance)
 
+            # Transcribe in the background while combine() prepares everything else
+            executor = ThreadPoolExecutor(max_workers=1)
+            self._subtitle_future = executor.submit(self.generate_subtitles, self.tts_path)
+            executor.shutdown(wait=False)
+
             # Combine everything
             path = self.combine()
 
@@ -3,7 +3,6 @@ import g4f
 import json
 import time
 import requests
-import assemblyai as aai
 
 from utils import *
 from cache import *
@@ -68,11 +67,14 @@ class YouTube:
         self.options.profile = profile
 
         # Set the service
-        self.service: Service = Service(GeckoDriverManager().install())
+        self.service: Service = Service(GeckoDriverManager().install(), **get_selenium_service_kwargs())
 
         # Initialize the browser
         self.browser: webdriver.Firefox = webdriver.Firefox(service=self.service, options=self.options)
 
+        # Remember the process group of the driver and browser, to kill them in one go
+        self.pgid: int = register_selenium_service(self.service)
+
         # Initialize video generator
         self.video_generator = Video(niche, language)
 
@@ -280,10 +282,12 @@ class YouTube:
 
             # Close the browser
             driver.quit()
+            unregister_selenium_service(self.pgid)
 
             return True
         except:
             self.browser.quit()
+            unregister_selenium_service(self.pgid)
             return False
 
     def get_videos(self) -> List[dict]:
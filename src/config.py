@@ -255,3 +255,19 @@ def get_script_sentence_length() -> int:
             return config_json["script_sentence_length"]
         else:
             return 4
+
+def get_image_concurrency() -> int:
+    """
+    Gets the amount of images to generate in parallel.
+    In case there is no image concurrency in config, returns 5 when none.
+    Values below 1 are raised to 1.
+
+    Returns:
+        concurrency (int): Amount of concurrent image generations
+    """
+    with open(os.path.join(ROOT_DIR, "config.json"), "r") as file:
+        config_json = json.load(file)
+        if (config_json.get("image_concurrency") is not None):
+            return max(1, int(config_json["image_concurrency"]))
+        else:
+            return 5
@@ -2,16 +2,23 @@
 import sys
 import argparse
 from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from status import *
 from cache import get_accounts
 from config import get_verbose
+from utils import unregister_selenium_service
 from classes.Tts import TTS
 from classes.Twitter import Twitter
 from classes.YouTube import YouTube
 from classes.Video import Video
 from state import VideoState
 
+# Bulkheads: loading the TTS model and starting the upload browser get their own
+# pools, so neither holds up video generation (LLM calls run on llm_utils' pool)
+TTS_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+UPLOAD_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload")
+
 def get_latest_incomplete_session(state_manager: VideoState) -> Optional[dict]:
     """Get the most recently updated incomplete session.
     
@@ -21,27 +28,38 @@ def get_latest_incomplete_session(state_manager: VideoState) -> Optional[dict]:
     Returns:
         The most recent incomplete session or None if no incomplete sessions exist
     """
-    incomplete = state_manager.get_incomplete_sessions()
-    if not incomplete:
-        return None
-        
-    # Sort by last_updated time and get the most recent
-    latest = max(
-        incomplete.items(),
-        key=lambda x: x[1].get("last_updated", x[1]["created_at"])
-    )
-    return latest[1]
+    return state_manager.get_latest_incomplete_session()
 
-def handle_video_generation(account_id: Optional[str], force_new: bool = False, clean: bool = False) -> None:
-    """Handle video generation with support for resuming sessions.
+def quit_upload_browser(youtube_future: Future) -> None:
+    """Stop the browser started for an upload that will not happen.
+    
+    Args:
+        youtube_future: The Future of the YouTube instance
+    """
+    # Not started yet, so there is no browser to quit
+    if youtube_future.cancel():
+        return
+    
+    try:
+        youtube = youtube_future.result()
+    except Exception:
+        # The browser never came up
+        return
+    
+    youtube.browser.quit()
+    unregister_selenium_service(youtube.pgid)
+
+def prepare_video(force_new: bool = False, clean: bool = False) -> Video:
+    """Pick the session to work on, resuming the latest incomplete one when possible.
     
     Args:
-        account_id: Optional YouTube account ID
         force_new: Whether to force create a new session
         clean: Whether to clean up incomplete sessions
+        
+    Returns:
+        The Video of the chosen session
     """
     verbose = get_verbose()
-    tts = TTS()
     state_manager = VideoState()
     
     # Clean up if requested
@@ -51,7 +69,6 @@ def handle_video_generation(account_id: Optional[str], force_new: bool = False,
         state_manager.cleanup_incomplete_sessions()
     
     # If not forcing new, try to find an incomplete session
-    session = None
     if not force_new:
         session = get_latest_incomplete_session(state_manager)
         if session:
@@ -60,7 +77,7 @@ def handle_video_generation(account_id: Optional[str], force_new: bool = False,
                 info(f"Session status: {session['status']}")
                 info(f"Last updated: {session.get('last_updated', 'Never')}")
             
-            video = Video(
+            return Video(
                 session["niche"],
                 session["language"],
                 session_id=session["id"]
@@ -69,17 +86,28 @@ def handle_video_generation(account_id: Optional[str], force_new: bool = False,
             info("No incomplete sessions found, starting new video generation")
     
     # If forcing new or no incomplete session found, create new
-    if force_new or not session:
-        if verbose and force_new:
-            info("Forcing new video generation session")
-        video = Video(
-            "Science",  # TODO: Get from account or config
-            "English"
-        )
+    if verbose and force_new:
+        info("Forcing new video generation session")
+    return Video(
+        "Science",  # TODO: Get from account or config
+        "English"
+    )
+
+def handle_video_generation(account_id: Optional[str], force_new: bool = False, clean: bool = False) -> None:
+    """Handle video generation with support for resuming sessions.
+    
+    Args:
+        account_id: Optional YouTube account ID
+        force_new: Whether to force create a new session
+        clean: Whether to clean up incomplete sessions
+    """
+    # The TTS model loads in the background while the script is written
+    tts = TTS_POOL.submit(TTS)
+    video = prepare_video(force_new, clean)
     
     # Generate the video
     video_path = video.generate_video(tts)
-    if verbose and video_path:
+    if get_verbose() and video_path:
         success(f"Generated video at: {video_path}")
     
     return video_path
@@ -136,7 +164,7 @@ def main():
         if verbose:
             success("Done posting.")
 
-    elif args.purpose == "youtube" or args.purpose == "video_generate":
+    elif args.purpose == "video_generate":
         # Generate the video
         video_path = handle_video_generation(args.account_id, args.new, args.clean)
         
@@ -144,36 +172,54 @@ def main():
             error("Failed to generate video")
             sys.exit(1)
 
-        # Upload if needed
-        if args.purpose == "youtube":
-            accounts = get_accounts("youtube")
-            if not accounts:
-                error("No YouTube accounts found.")
+    elif args.purpose == "youtube":
+        accounts = get_accounts("youtube")
+        if not accounts:
+            error("No YouTube accounts found.")
+            sys.exit(1)
+
+        # If no account_id provided, use the first account
+        if not args.account_id:
+            account = accounts[0]
+            if verbose:
+                info(f"No account ID provided. Using first available account: {account['nickname']}")
+        else:
+            account = next((acc for acc in accounts if acc["id"] == args.account_id), None)
+            if not account:
+                error(f"No YouTube account found with ID: {args.account_id}")
                 sys.exit(1)
 
-            # If no account_id provided, use the first account
-            if not args.account_id:
-                account = accounts[0]
-                if verbose:
-                    info(f"No account ID provided. Using first available account: {account['nickname']}")
-            else:
-                account = next((acc for acc in accounts if acc["id"] == args.account_id), None)
-                if not account:
-                    error(f"No YouTube account found with ID: {args.account_id}")
-                    sys.exit(1)
+        # The TTS model loads in the background while the script is written
+        tts = TTS_POOL.submit(TTS)
+        video = prepare_video(args.new, args.clean)
 
-            if verbose:
-                info("Initializing YouTube...")
-            youtube = YouTube(
-                account["id"],
-                account["nickname"],
-                account["firefox_profile"],
-                account["niche"],
-                account["language"]
-            )
-            youtube.upload_video()
-            if verbose:
-                success("Uploaded Short.")
+        # Start the browser while the video is generated. The session to
+        # work on is already chosen, so the YouTube session cannot be resumed.
+        if verbose:
+            info("Initializing YouTube...")
+        youtube_future = UPLOAD_POOL.submit(
+            YouTube,
+            account["id"],
+            account["nickname"],
+            account["firefox_profile"],
+            account["niche"],
+            account["language"]
+        )
+
+        # Generate the video
+        video_path = video.generate_video(tts)
+        if not video_path:
+            error("Failed to generate video")
+            quit_upload_browser(youtube_future)
+            sys.exit(1)
+        if verbose:
+            success(f"Generated video at: {video_path}")
+
+        # Upload the video
+        youtube = youtube_future.result()
+        youtube.upload_video()
+        if verbose:
+            success("Uploaded Short.")
     else:
         error("Invalid Purpose, exiting...")
         sys.exit(1)
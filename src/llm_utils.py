@@ -1,18 +1,281 @@
+import os
 import g4f
 import ssl
 import time
-from config import get_model, get_verbose
+import random
+import asyncio
+import hashlib
+import functools
+import threading
+from typing import List, Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from config import ROOT_DIR, get_model, get_verbose
 from constants import parse_model
 from status import info, warning, error
 
+# Responses are cached in memory and on disk, keyed on the prompt and model
+LLM_CACHE_DIR = os.path.join(ROOT_DIR, ".cache", "llm")
+LLM_MEMORY_CACHE_SIZE = 256
+
+_memory_cache = OrderedDict()
+_memory_cache_lock = threading.Lock()
+
+# How long the scanned g4f provider list is reused, in seconds
+LLM_PROVIDERS_CACHE_TTL = 60.0
+
+_providers_cache = None
+
+# Circuit breaker: consecutive failures of one kind before a provider is skipped,
+# and how long it is skipped for (doubled on every trip, quota failures wait for midnight UTC)
+LLM_BREAKER_THRESHOLD = 3
+LLM_BREAKER_COOLDOWN = 60.0
+LLM_BREAKER_MAX_COOLDOWN = 3600.0
+
+# Per provider timeout: 1.5x the p95 latency of the last LLM_LATENCY_WINDOW calls of
+# the same request class, clamped to [LLM_TIMEOUT_MIN, LLM_TIMEOUT_MAX], until then LLM_TIMEOUT_MAX
+LLM_LATENCY_WINDOW = 50
+LLM_LATENCY_MIN_SAMPLES = 5
+LLM_TIMEOUT_MIN = 5.0
+LLM_TIMEOUT_MAX = 30.0
+
+# Requests with a larger token budget or a longer prompt than this are timed separately,
+# so quick replies (topics, titles) never tighten the timeout of long generations (scripts)
+LLM_LONG_REQUEST_TOKENS = 512
+LLM_LONG_REQUEST_PROMPT = 1000
+
+# Amount of providers queried at the same time when racing them against each other
+LLM_RACE_CONCURRENCY = 4
+
+# Providers without async support are called on a dedicated pool so abandoned
+# calls of a finished race never hold up the event loop
+_provider_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-provider")
+
+# generate_response runs the async version on one event loop per thread
+_event_loops = threading.local()
+
+class _ProviderHealth:
+    """Circuit breaker of a single provider.
+
+    Closed while the provider works. Opens after LLM_BREAKER_THRESHOLD consecutive
+    failures of the same category, which skips the provider until its cooldown ends.
+    Then a single probe request is let through (half-open), closing the breaker
+    on success and opening it again, with a longer cooldown, on failure.
+    """
+
+    def __init__(self):
+        """Initialize a closed breaker."""
+        self.consecutive_failures = 0
+        self.last_category = None
+        self.last_failure = None
+        self.tripped_until = None
+        self.trips = 0
+        self.probing = False
+        self.latencies = {}
+
+    def record_latency(self, request_class: str, seconds: float) -> None:
+        """Record how long a request took.
+
+        Args:
+            request_class: The request class, see _get_request_class
+            seconds: The duration of the request
+        """
+        if request_class not in self.latencies:
+            self.latencies[request_class] = deque(maxlen=LLM_LATENCY_WINDOW)
+        self.latencies[request_class].append(seconds)
+
+    def get_timeout(self, request_class: str) -> float:
+        """Get the timeout for the next request, derived from the observed p95 latency.
+
+        Args:
+            request_class: The request class, see _get_request_class
+
+        Returns:
+            The timeout in seconds
+        """
+        window = self.latencies.get(request_class, ())
+        if len(window) < LLM_LATENCY_MIN_SAMPLES:
+            return LLM_TIMEOUT_MAX
+        latencies = sorted(window)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        return max(LLM_TIMEOUT_MIN, min(LLM_TIMEOUT_MAX, 1.5 * p95))
+
+    def is_available(self, now: float) -> bool:
+        """Check if the provider may be used, claiming the probe when half-open.
+
+        Args:
+            now: The current UNIX timestamp
+
+        Returns:
+            True if the provider may be used
+        """
+        if self.tripped_until is None:
+            return True
+        if now < self.tripped_until or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def release_probe(self) -> None:
+        """Give back the half-open probe of a request that was cancelled."""
+        self.probing = False
+
+    def record_success(self) -> None:
+        """Close the breaker after a successful request."""
+        self.consecutive_failures = 0
+        self.last_category = None
+        self.tripped_until = None
+        self.trips = 0
+        self.probing = False
+
+    def record_failure(self, category: str, now: float) -> bool:
+        """Record a failed request, opening the breaker when needed.
+
+        Args:
+            category: The failure category, see _classify_failure
+            now: The current UNIX timestamp
+
+        Returns:
+            True if the breaker was opened
+        """
+        if category == self.last_category:
+            self.consecutive_failures += 1
+        else:
+            self.consecutive_failures = 1
+        self.last_category = category
+        self.last_failure = now
+
+        # A failed probe opens the breaker again right away
+        if not self.probing and self.consecutive_failures < LLM_BREAKER_THRESHOLD:
+            return False
+
+        self.trips += 1
+        self.probing = False
+        if category == "quota":
+            # Quotas reset at midnight UTC
+            self.tripped_until = (now // 86400 + 1) * 86400
+        else:
+            self.tripped_until = now + min(LLM_BREAKER_COOLDOWN * 2 ** (self.trips - 1), LLM_BREAKER_MAX_COOLDOWN)
+        return True
+
+class _AdaptiveTimeout(Exception):
+    """A request hit a timeout tightened from observed latencies.
+
+    The provider may just have been given too little time, so this is not
+    counted as a circuit breaker failure.
+    """
+
+_provider_health = {}
+_provider_health_lock = threading.RLock()
+
+def _get_provider_health(provider) -> _ProviderHealth:
+    """
+    Gets the circuit breaker of a provider, creating it on first use.
+
+    Args:
+        provider: The provider class.
+
+    Returns:
+        health (_ProviderHealth): The circuit breaker of the provider.
+    """
+    with _provider_health_lock:
+        if provider not in _provider_health:
+            _provider_health[provider] = _ProviderHealth()
+        return _provider_health[provider]
+
+def _classify_failure(exception: BaseException) -> str:
+    """
+    Classifies a provider failure, so only repeated failures of the same kind open the breaker.
+
+    Args:
+        exception (BaseException): The exception raised by the provider.
+
+    Returns:
+        category (str): One of "quota", "rate_limit", "ssl", "timeout" or "other".
+    """
+    message = str(exception).lower()
+    if "quota" in message:
+        return "quota"
+    if "429" in message or "rate limit" in message or "too many requests" in message:
+        return "rate_limit"
+    if isinstance(exception, ssl.SSLError) or "ssl" in message:
+        return "ssl"
+    if isinstance(exception, (TimeoutError, asyncio.TimeoutError)) or "timeout" in message or "timed out" in message:
+        return "timeout"
+    return "other"
+
+def _record_failure(provider, exception: BaseException) -> None:
+    """
+    Records a provider failure in its circuit breaker.
+
+    Args:
+        provider: The provider class.
+        exception (BaseException): The exception raised by the provider.
+
+    Returns:
+        None
+    """
+    category = _classify_failure(exception)
+    health = _get_provider_health(provider)
+    with _provider_health_lock:
+        tripped = health.record_failure(category, time.time())
+    if tripped and get_verbose():
+        warning(f"Provider {provider.__name__} keeps failing ({category}), skipping it for {int(health.tripped_until - time.time())} seconds")
+
+def _get_request_class(prompt: str, max_tokens: Optional[int]) -> str:
+    """
+    Classifies a request by its expected duration, each class has its own latency window.
+
+    Args:
+        prompt (str): The prompt of the request.
+        max_tokens (int): The token budget of the request, if any.
+
+    Returns:
+        request_class (str): "long" or "short".
+    """
+    if (max_tokens or 0) >= LLM_LONG_REQUEST_TOKENS or len(prompt) >= LLM_LONG_REQUEST_PROMPT:
+        return "long"
+    return "short"
+
+def _backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    Computes the wait before the next retry: exponential backoff, capped and jittered
+    so retries of concurrent runs do not hit the providers in lockstep.
+
+    Args:
+        attempt (int): The number of the failed attempt, starting at 0.
+        base (float, optional): The wait after the first attempt, in seconds. Defaults to 1.0.
+        cap (float, optional): The longest wait before jitter, in seconds. Defaults to 30.0.
+
+    Returns:
+        delay (float): The wait in seconds.
+    """
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def invalidate_providers_cache() -> None:
+    """
+    Forces the next get_available_providers call to scan g4f again.
+
+    Returns:
+        None
+    """
+    global _providers_cache
+    _providers_cache = None
+
 def get_available_providers():
     """
     Get a list of available working providers from g4f.
     Filters out providers that are known to be problematic.
+    The list is cached for LLM_PROVIDERS_CACHE_TTL seconds.
     
     Returns:
         List of available provider classes
     """
+    global _providers_cache
+    cached = _providers_cache
+    if cached and time.monotonic() - cached[0] < LLM_PROVIDERS_CACHE_TTL:
+        return list(cached[1])
+
     # Get all provider classes that are marked as working
     providers = []
     
@@ -50,9 +313,112 @@ def get_available_providers():
     if get_verbose():
         info(f" => Available providers: {[p.__name__ for p in providers]}")
     
-    return providers
+    _providers_cache = (time.monotonic(), providers)
+    return list(providers)
+
+async def _race_providers(model: any, messages: List[dict], providers: list, extra_args: dict, request_class: str = "short") -> Tuple[Optional[str], list]:
+    """
+    Races the providers against each other, at most LLM_RACE_CONCURRENCY at a time,
+    and returns the first non-empty response. Providers still running are cancelled.
+
+    Args:
+        model (any): The model to use.
+        messages (List[dict]): The chat messages to send.
+        providers (list): The provider classes to race.
+        extra_args (dict): Extra arguments for the g4f completion call.
+        request_class (str, optional): The request class, see _get_request_class. Defaults to "short".
 
-def generate_response(prompt: str, model: any = None, max_retries: int = 3) -> str:
+    Returns:
+        result (Tuple[Optional[str], list]): The response (None if every provider failed)
+            and the providers that failed.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(LLM_RACE_CONCURRENCY)
+
+    async def attempt(provider):
+        async with semaphore:
+            if get_verbose():
+                info(f" => Trying provider: {provider.__name__}")
+
+            health = _get_provider_health(provider)
+            with _provider_health_lock:
+                timeout = health.get_timeout(request_class)
+            started = time.monotonic()
+
+            try:
+                if hasattr(provider, "create_async"):
+                    # Native async providers run on the event loop and are really cancelled
+                    response = await g4f.ChatCompletion.create_async(
+                        model=model,
+                        provider=provider,
+                        messages=messages,
+                        timeout=timeout,
+                        **extra_args
+                    )
+                else:
+                    response = await loop.run_in_executor(_provider_executor, functools.partial(
+                        g4f.ChatCompletion.create,
+                        model=model,
+                        provider=provider,
+                        messages=messages,
+                        timeout=timeout,
+                        **extra_args
+                    ))
+            except Exception as e:
+                if _classify_failure(e) != "timeout":
+                    raise
+
+                # Timeouts count as samples too, so a timeout that is too tight grows again
+                with _provider_health_lock:
+                    health.record_latency(request_class, time.monotonic() - started)
+                if timeout < LLM_TIMEOUT_MAX:
+                    raise _AdaptiveTimeout(f"Timed out after the adaptive limit of {timeout:.1f} seconds") from e
+                raise
+
+            with _provider_health_lock:
+                health.record_latency(request_class, time.monotonic() - started)
+
+            if not response or len(response.strip()) == 0:
+                raise ValueError("Empty response")
+            return response
+
+    tasks = {asyncio.ensure_future(attempt(provider)): provider for provider in providers}
+    pending = set(tasks)
+    failed = []
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider = tasks[task]
+                if task.exception() is not None:
+                    if get_verbose():
+                        warning(f"Provider {provider.__name__} failed: {str(task.exception())}")
+                    if isinstance(task.exception(), _AdaptiveTimeout):
+                        # Retried with a longer timeout, the breaker is left alone
+                        with _provider_health_lock:
+                            _get_provider_health(provider).release_probe()
+                    else:
+                        _record_failure(provider, task.exception())
+                    failed.append(provider)
+                    continue
+
+                response = task.result()
+                with _provider_health_lock:
+                    _get_provider_health(provider).record_success()
+                # Log response if verbose mode is enabled
+                if get_verbose():
+                    info(f" => LLM Response from {provider.__name__}: {response}\n")
+                return response, failed
+    finally:
+        for task in pending:
+            task.cancel()
+            with _provider_health_lock:
+                _get_provider_health(tasks[task]).release_probe()
+
+    return None, failed
+
+async def generate_response_async(prompt: str, model: any = None, max_retries: int = 3, max_tokens: int = None) -> str:
     """
     Generates an LLM Response based on a prompt and the user-provided model.
     Includes retry logic and error handling.
@@ -61,6 +427,7 @@ def generate_response(prompt: str, model: any = None, max_retries: int = 3) -> s
         prompt (str): The prompt to use in the text generation.
         model (any, optional): The specific model to use. If None, uses the default model from config.
         max_retries (int, optional): Maximum number of retry attempts. Defaults to 3.
+        max_tokens (int, optional): Upper bound for the length of the response. Defaults to None (provider default).
 
     Returns:
         response (str): The generated AI Response.
@@ -77,6 +444,10 @@ def generate_response(prompt: str, model: any = None, max_retries: int = 3) -> s
     # Create an unverified SSL context
     ssl._create_default_https_context = ssl._create_unverified_context
     
+    # Only pass a token budget when one was requested
+    extra_args = {"max_tokens": max_tokens} if max_tokens else {}
+    request_class = _get_request_class(prompt, max_tokens)
+    
     # Get list of available providers
     providers = get_available_providers()
     
@@ -84,39 +455,167 @@ def generate_response(prompt: str, model: any = None, max_retries: int = 3) -> s
         error("No working providers found")
         return None
     
+    messages = [{
+        "role": "user",
+        "content": prompt
+    }]
+    
     for attempt in range(max_retries):
-        for provider in providers:
-            try:
-                if get_verbose():
-                    info(f" => Trying provider: {provider.__name__}")
-                
-                response = g4f.ChatCompletion.create(
-                    model=model,
-                    provider=provider,
-                    messages=[{
-                        "role": "user",
-                        "content": prompt
-                    }],
-                    timeout=30
-                )
-                
-                if response and len(response.strip()) > 0:
-                    # Log response if verbose mode is enabled
-                    if get_verbose():
-                        info(f" => LLM Response from {provider.__name__}: {response}\n")
-                    return response
-                    
-            except Exception as e:
-                if get_verbose():
-                    warning(f"Provider {provider.__name__} failed: {str(e)}")
-                continue
+        # Skip providers whose circuit breaker is open
+        now = time.time()
+        with _provider_health_lock:
+            providers = [provider for provider in providers if _get_provider_health(provider).is_available(now)]
+        if not providers:
+            error("All LLM providers are cooling down after repeated failures")
+            return None
+
+        response, failed = await _race_providers(model, messages, providers, extra_args, request_class)
+        if response:
+            return response
                 
         if attempt < max_retries - 1:
+            # Only race the providers that actually errored again
+            providers = failed
+            delay = _backoff(attempt)
+
+            # Skip the wait when every provider stays tripped past it anyway
+            retry_at = time.time() + delay
+            with _provider_health_lock:
+                reopening = [
+                    provider for provider in providers
+                    if (_get_provider_health(provider).tripped_until or 0) <= retry_at
+                ]
+            if not reopening:
+                continue
+
             if get_verbose():
-                warning(f"All providers failed on attempt {attempt + 1}, retrying in 5 seconds...")
-            time.sleep(5)
-            # Refresh provider list in case some became available
-            providers = get_available_providers()
+                warning(f"All providers failed on attempt {attempt + 1}, retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
     
     error("All LLM providers failed after maximum retries")
-    return None 
\ No newline at end of file
+    return None
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Gets the event loop of the current thread, creating it on first use.
+    Reusing the loop keeps the connections opened by async providers alive between calls.
+
+    Returns:
+        loop (asyncio.AbstractEventLoop): The event loop of this thread.
+    """
+    loop = getattr(_event_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _event_loops.loop = loop
+    return loop
+
+def generate_response(prompt: str, model: any = None, max_retries: int = 3, max_tokens: int = None) -> str:
+    """
+    Generates an LLM Response, blocking until it is done.
+    Runs generate_response_async on the event loop of the calling thread,
+    async code should await generate_response_async directly.
+
+    Args:
+        prompt (str): The prompt to use in the text generation.
+        model (any, optional): The specific model to use. If None, uses the default model from config.
+        max_retries (int, optional): Maximum number of retry attempts. Defaults to 3.
+        max_tokens (int, optional): Upper bound for the length of the response. Defaults to None (provider default).
+
+    Returns:
+        response (str): The generated AI Response.
+    """
+    return _get_event_loop().run_until_complete(generate_response_async(
+        prompt,
+        model=model,
+        max_retries=max_retries,
+        max_tokens=max_tokens
+    ))
+
+def _get_cache_key(prompt: str, model: any) -> str:
+    """
+    Builds the cache key for a prompt and model.
+
+    Args:
+        prompt (str): The prompt used in the text generation.
+        model (any): The model used in the text generation.
+
+    Returns:
+        key (str): Hex digest identifying the prompt and model.
+    """
+    model_name = getattr(model, "name", model) or "default"
+    return hashlib.sha256(f"{model_name}\x00{prompt}".encode("utf-8")).hexdigest()
+
+def _remember_response(key: str, response: str) -> None:
+    """
+    Stores a response in the in-memory cache, evicting the least recently used entry when full.
+
+    Args:
+        key (str): The cache key.
+        response (str): The generated AI Response.
+
+    Returns:
+        None
+    """
+    with _memory_cache_lock:
+        _memory_cache[key] = response
+        _memory_cache.move_to_end(key)
+        if len(_memory_cache) > LLM_MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+def cached_generate_response(prompt: str, model: any = None, refresh: bool = False, **kwargs) -> str:
+    """
+    Generates an LLM Response like generate_response, but reuses the
+    response of an earlier identical request from memory or disk.
+
+    Args:
+        prompt (str): The prompt to use in the text generation.
+        model (any, optional): The specific model to use. If None, uses the default model from config.
+        refresh (bool, optional): Skip the lookup and store a freshly generated response,
+            e.g. when the cached one was rejected. Defaults to False.
+        **kwargs: Passed on to generate_response.
+
+    Returns:
+        response (str): The generated AI Response.
+    """
+    if not model:
+        model = parse_model(get_model())
+
+    key = _get_cache_key(prompt, model)
+    cache_path = os.path.join(LLM_CACHE_DIR, f"{key}.txt")
+
+    if not refresh:
+        with _memory_cache_lock:
+            if key in _memory_cache:
+                _memory_cache.move_to_end(key)
+                if get_verbose():
+                    info(" => LLM Response served from memory cache")
+                return _memory_cache[key]
+
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as file:
+                    response = file.read()
+                _remember_response(key, response)
+                if get_verbose():
+                    info(" => LLM Response served from disk cache")
+                return response
+            except Exception as e:
+                if get_verbose():
+                    warning(f"Failed to read LLM cache: {str(e)}")
+
+    response = generate_response(prompt, model=model, **kwargs)
+
+    # Never cache failures
+    if not response:
+        return response
+
+    _remember_response(key, response)
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as file:
+            file.write(response)
+    except Exception as e:
+        if get_verbose():
+            warning(f"Failed to write LLM cache: {str(e)}")
+
+    return response
@@ -3,18 +3,7 @@ Collection of prompts used for content generation.
 Each prompt is designed for a specific purpose and can be formatted with variables.
 """
 
-def get_image_prompts_prompt(n_prompts: int, subject: str, script: str) -> str:
-    """Get the prompt for generating AI image prompts.
-    
-    Args:
-        n_prompts: Number of image prompts to generate
-        subject: The subject/topic of the video
-        script: The full script text for context
-        
-    Returns:
-        The formatted prompt string
-    """
-    return f"""
+_IMAGE_PROMPTS_TMPL = """
     Generate {n_prompts} Image Prompts for AI Image Generation,
     depending on the subject of a video.
     Subject: {subject}
@@ -38,4 +27,61 @@ def get_image_prompts_prompt(n_prompts: int, subject: str, script: str) -> str:
 
     For context, here is the full text:
     {script}
-    """ 
\ No newline at end of file
+    """
+
+def get_image_prompts_prompt(n_prompts: int, subject: str, script: str) -> str:
+    """Get the prompt for generating AI image prompts.
+    
+    Args:
+        n_prompts: Number of image prompts to generate
+        subject: The subject/topic of the video
+        script: The full script text for context
+        
+    Returns:
+        The formatted prompt string
+    """
+    return _IMAGE_PROMPTS_TMPL.format(
+        n_prompts=n_prompts,
+        subject=subject,
+        script=script
+    )
+
+_SCRIPT_PROMPT_TMPL = """
+    Generate a script for a video in {sentence_length} sentences, depending on the subject of the video.
+
+    The script is to be returned as a string with the specified number of paragraphs.
+
+    Here is an example of a string:
+    "This is an example string."
+
+    Do not under any circumstance reference this prompt in your response.
+
+    Get straight to the point, don't start with unnecessary things like, "welcome to this video".
+
+    Obviously, the script should be related to the subject of the video.
+    
+    YOU MUST NOT EXCEED THE {sentence_length} SENTENCES LIMIT. MAKE SURE THE {sentence_length} SENTENCES ARE SHORT.
+    YOU MUST NOT INCLUDE ANY TYPE OF MARKDOWN OR FORMATTING IN THE SCRIPT, NEVER USE A TITLE.
+    YOU MUST WRITE THE SCRIPT IN THE LANGUAGE SPECIFIED IN [LANGUAGE].
+    ONLY RETURN THE RAW CONTENT OF THE SCRIPT. DO NOT INCLUDE "VOICEOVER", "NARRATOR" OR SIMILAR INDICATORS OF WHAT SHOULD BE SPOKEN AT THE BEGINNING OF EACH PARAGRAPH OR LINE. YOU MUST NOT MENTION THE PROMPT, OR ANYTHING ABOUT THE SCRIPT ITSELF. ALSO, NEVER TALK ABOUT THE AMOUNT OF PARAGRAPHS OR LINES. JUST WRITE THE SCRIPT
+    
+    Subject: {subject}
+    Language: {language}
+    """
+
+def get_script_prompt(sentence_length: int, subject: str, language: str) -> str:
+    """Get the prompt for generating a video script.
+    
+    Args:
+        sentence_length: Number of sentences the script should have
+        subject: The subject/topic of the video
+        language: The language to write the script in
+        
+    Returns:
+        The formatted prompt string
+    """
+    return _SCRIPT_PROMPT_TMPL.format(
+        sentence_length=sentence_length,
+        subject=subject,
+        language=language
+    )
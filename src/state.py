@@ -1,18 +1,91 @@
 import os
 import json
-from typing import Dict, Optional
-from datetime import datetime
+import heapq
+import atexit
+import sqlite3
+import weakref
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from uuid import uuid4
 
 from config import ROOT_DIR, get_verbose
 from status import info, error, warning
 
-# Define the state file path
+# orjson is optional, it encodes and decodes session payloads a few times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_dumps(obj, indent: bool = False) -> bytes:
+    """Encode an object as UTF-8 JSON, using orjson when available.
+    
+    Args:
+        obj: The object to encode
+        indent: Whether to indent with two spaces
+        
+    Returns:
+        The encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Define the state file paths
 STATE_DIR = os.path.join(ROOT_DIR, ".state")
+VIDEO_STATE_DB = os.path.join(STATE_DIR, "video_state.db")
+
+# Legacy JSON state, imported into the database once and then renamed to *.imported
 VIDEO_STATE_FILE = os.path.join(STATE_DIR, "video_state.json")
 
+INCOMPLETE_STATUSES = ("initialized", "in_progress", "failed")
+
+# Fields every session has, _migrate_sessions adds them to old sessions
+_REQUIRED_FIELDS = frozenset(("id", "created_at", "status", "steps_completed", "data"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    last_updated TEXT,
+    completed_at TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_status ON sessions(status);
+CREATE INDEX IF NOT EXISTS sessions_status_updated ON sessions(status, last_updated DESC);
+"""
+_SCHEMA_VERSION = 1
+
+_UPSERT_SQL = (
+    "INSERT OR REPLACE INTO sessions (id, status, created_at, last_updated, completed_at, payload) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# Open VideoState instances, flushed at exit without keeping them alive
+_instances = weakref.WeakSet()
+
+def _flush_instances():
+    """Flush the buffered writes of every open VideoState."""
+    for instance in list(_instances):
+        instance._flush()
+
+atexit.register(_flush_instances)
+
 class VideoState:
-    """Manages the state of video generation process for persistence."""
+    """Manages the state of video generation process for persistence.
+    
+    Sessions are stored in SQLite, one row per session, so an update only
+    writes the session that changed. All sessions are also kept in memory
+    and get_session returns those dicts, which are updated in place.
+    
+    Sessions may be written from worker threads, e.g. by the image pool.
+    A transaction only buffers the writes of the thread that opened it.
+    """
     
     def __init__(self):
         """Initialize the state management system."""
@@ -20,13 +93,68 @@ class VideoState:
         if not os.path.exists(STATE_DIR):
             os.makedirs(STATE_DIR)
         
-        # Create or load state file
-        if not os.path.exists(VIDEO_STATE_FILE):
-            self._state = {}
-            self._save_state()
-        else:
-            self._load_state()
+        self._lock = threading.Lock()
+        self._txn = threading.local()
+        self._dirty = set()
+        self._conn = sqlite3.connect(VIDEO_STATE_DB, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        
+        self._load_state()
+        
+        # Flush buffered writes if the process exits inside a transaction
+        _instances.add(self)
+        
+        with self.transaction():
+            # Import the legacy JSON state once, when the database is new
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+                if not self._state and os.path.exists(VIDEO_STATE_FILE):
+                    self._import_json(VIDEO_STATE_FILE)
+                else:
+                    with self._conn:
+                        self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            
             self._migrate_sessions()
+        
+        # Max-heap of (-_updated_ts, session_id) for incomplete sessions
+        self._incomplete_heap: List[Tuple[float, str]] = []
+        for session_id, session in self._state.items():
+            self._stamp_session(session)
+            self._index_session(session_id)
+    
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Buffer session writes and flush them together on exit.
+        
+        Every session the current thread touches inside the block is written
+        once, in a single database transaction, when the outermost block
+        exits. Nested blocks join the outer one. Used by __init__, so that
+        loading and migrating the state writes each session at most once.
+        """
+        if self._in_txn:
+            yield
+            return
+        
+        self._txn.active = True
+        try:
+            yield
+        finally:
+            self._txn.active = False
+            self._flush()
+    
+    @property
+    def _in_txn(self) -> bool:
+        """Whether the current thread is inside a transaction."""
+        return getattr(self._txn, "active", False)
+    
+    def _flush(self):
+        """Write all sessions buffered by a transaction."""
+        with self._lock:
+            session_ids = [session_id for session_id in self._dirty if session_id in self._state]
+            self._dirty.clear()
+        if session_ids:
+            self._save_sessions(session_ids)
     
     def _migrate_sessions(self):
         """Migrate old session format to new format.
@@ -34,61 +162,271 @@ class VideoState:
         This ensures all sessions have required fields and updates
         any old sessions to the new format.
         """
-        modified = False
+        verbose = get_verbose()
+        now_iso = datetime.now().isoformat()
+        migrated = []
         for session_id, session in self._state.items():
-            # Add ID field if missing
-            if 'id' not in session:
-                session['id'] = session_id
-                modified = True
-                if get_verbose():
-                    info(f"Migrated session {session_id}: Added ID field")
+            missing = _REQUIRED_FIELDS - session.keys()
+            needs_last_updated = 'last_updated' not in session and session.get('status') != 'completed'
+            if not missing and not needs_last_updated:
+                continue
             
-            # Add last_updated if missing
-            if 'last_updated' not in session and session.get('status') != 'completed':
+            # Add last_updated if missing, before created_at gets a default
+            if needs_last_updated:
                 session['last_updated'] = session.get('created_at')
-                modified = True
-                if get_verbose():
+                if verbose:
                     info(f"Migrated session {session_id}: Added last_updated field")
             
-            # Ensure all required fields exist
-            required_fields = {
-                'created_at': datetime.now().isoformat(),
+            # Add the missing required fields
+            defaults = {
+                'id': session_id,
+                'created_at': now_iso,
                 'status': 'initialized',
                 'steps_completed': [],
                 'data': {}
             }
+            for field in missing:
+                session[field] = defaults[field]
+                if verbose:
+                    info(f"Migrated session {session_id}: Added missing field {field}")
             
-            for field, default_value in required_fields.items():
-                if field not in session:
-                    session[field] = default_value
-                    modified = True
-                    if get_verbose():
-                        info(f"Migrated session {session_id}: Added missing field {field}")
-        
-        if modified:
-            if get_verbose():
+            migrated.append(session_id)
+        
+        if migrated:
+            if verbose:
                 info("Saving migrated sessions...")
-            self._save_state()
+            self._save_sessions(migrated)
     
     def _load_state(self):
-        """Load the state from the JSON file."""
+        """Load the state from the database."""
         try:
-            with open(VIDEO_STATE_FILE, 'r') as f:
-                self._state = json.load(f)
+            rows = self._conn.execute("SELECT id, payload FROM sessions").fetchall()
+            self._state = {session_id: _json_loads(payload) for session_id, payload in rows}
         except Exception as e:
             if get_verbose():
                 error(f"Failed to load state: {str(e)}")
             self._state = {}
     
-    def _save_state(self):
-        """Save the current state to the JSON file."""
+    def _import_json(self, path: str):
+        """Import sessions from a legacy JSON state file.
+        
+        The sessions and the schema version are committed in one database
+        transaction, and errors writing them are raised. The file is only
+        renamed once that transaction has been committed.
+        
+        Args:
+            path: The path to the JSON state file
+        """
+        try:
+            with open(path, 'rb') as f:
+                state = _json_loads(f.read())
+        except Exception as e:
+            if get_verbose():
+                error(f"Failed to import state from {path}: {str(e)}")
+            # Leave the file alone, an unreadable file is not retried on every start
+            with self._conn:
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            return
+        
+        self._state = state
+        rows = [self._session_row(session_id) for session_id in self._state]
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(_UPSERT_SQL, rows)
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        except Exception:
+            self._state = {}
+            raise
+        
+        # Move the file out of the way, so it is not mistaken for the live state
         try:
-            with open(VIDEO_STATE_FILE, 'w') as f:
-                json.dump(self._state, f, indent=2)
+            os.replace(path, f"{path}.imported")
+        except OSError as e:
+            if get_verbose():
+                warning(f"Failed to rename {path}: {str(e)}")
+        info(f"Imported {len(self._state)} sessions from {path} into {VIDEO_STATE_DB}, the JSON file is no longer used")
+    
+    def _session_row(self, session_id: str) -> tuple:
+        """Build the database row of a session.
+        
+        Args:
+            session_id: The video session identifier
+            
+        Returns:
+            The values for the sessions table
+        """
+        session = self._state[session_id]
+        return (
+            session_id,
+            session.get("status", "initialized"),
+            session.get("created_at"),
+            session.get("last_updated"),
+            session.get("completed_at"),
+            _json_dumps(self._serialize(session)).decode("utf-8")
+        )
+    
+    def _save_sessions(self, session_ids: Iterable[str]):
+        """Write the given sessions to the database in one transaction.
+        
+        Args:
+            session_ids: The sessions to write
+        """
+        if self._in_txn:
+            with self._lock:
+                self._dirty.update(session_ids)
+            return
+        
+        try:
+            rows = [self._session_row(session_id) for session_id in session_ids]
+            with self._lock, self._conn:
+                self._conn.executemany(_UPSERT_SQL, rows)
         except Exception as e:
             if get_verbose():
                 error(f"Failed to save state: {str(e)}")
     
+    def _save_session(self, session_id: str):
+        """Write a single session to the database.
+        
+        Args:
+            session_id: The session to write
+        """
+        self._save_sessions([session_id])
+    
+    def _delete_sessions(self, session_ids: List[str]):
+        """Remove sessions from the database and from memory.
+        
+        Args:
+            session_ids: The sessions to remove
+        """
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany("DELETE FROM sessions WHERE id = ?", [(session_id,) for session_id in session_ids])
+        except Exception as e:
+            if get_verbose():
+                error(f"Failed to delete sessions: {str(e)}")
+            return
+        
+        for session_id in session_ids:
+            self._state.pop(session_id, None)
+            self._dirty.discard(session_id)
+            self._discard_image_log(session_id)
+    
+    @staticmethod
+    def _stamp_session(session: Dict):
+        """Cache the session's timestamps as epoch floats.
+        
+        The ISO strings are parsed once here so lookups and cleanup can
+        compare floats. The cached fields are prefixed with an underscore
+        and are never persisted. A field is left unset if its timestamp
+        cannot be parsed.
+        
+        Args:
+            session: The session state
+        """
+        try:
+            updated = session.get("last_updated") or session["created_at"]
+            session["_updated_ts"] = datetime.fromisoformat(updated).timestamp()
+        except (TypeError, ValueError):
+            pass
+        
+        try:
+            if session.get("completed_at"):
+                session["_completed_ts"] = datetime.fromisoformat(session["completed_at"]).timestamp()
+        except (TypeError, ValueError):
+            pass
+    
+    @staticmethod
+    def _serialize(session: Dict) -> Dict:
+        """Strip the cached, underscore-prefixed fields from a session.
+        
+        Args:
+            session: The session state
+            
+        Returns:
+            The session as it is persisted
+        """
+        return {key: value for key, value in session.items() if not key.startswith("_")}
+    
+    def _index_session(self, session_id: str):
+        """Push an incomplete session onto the incomplete session heap.
+        
+        Entries are never removed eagerly. An entry goes stale once its
+        session is completed, removed or updated again, and stale entries
+        are dropped when they reach the top of the heap.
+        
+        Args:
+            session_id: The session to index
+        """
+        session = self._state[session_id]
+        if session["status"] not in INCOMPLETE_STATUSES:
+            return
+        
+        # Sessions without a parsable timestamp sort as the oldest
+        heapq.heappush(self._incomplete_heap, (-session.get("_updated_ts", 0.0), session_id))
+    
+    def _save_state(self):
+        """Save every session to the database."""
+        self._save_sessions(list(self._state))
+    
+    def _get_image_log_path(self, session_id: str) -> str:
+        """Get the path to the append-only image log of a session.
+        
+        Args:
+            session_id: The video session identifier
+            
+        Returns:
+            The path to the session's image log
+        """
+        return os.path.join(STATE_DIR, f"{session_id}.images.jsonl")
+    
+    def _fold_image_log(self, session_id: str) -> bool:
+        """Merge the image log of a session into its state and remove the log.
+        
+        The state is only updated in memory, the caller is responsible for saving it.
+        
+        Args:
+            session_id: The video session identifier
+            
+        Returns:
+            True if the session state was modified
+        """
+        log_path = self._get_image_log_path(session_id)
+        if not os.path.exists(log_path):
+            return False
+        
+        try:
+            with open(log_path, 'rb') as f:
+                entries = [_json_loads(line) for line in f if line.strip()]
+        except Exception as e:
+            if get_verbose():
+                error(f"Failed to read image log: {str(e)}")
+            return False
+        
+        images = self._state[session_id]["data"].setdefault("images", {})
+        paths = images.setdefault("paths", [])
+        by_index = images.setdefault("by_index", {})
+        for entry in entries:
+            # Older logs hold bare paths, or a prompt without its index
+            path = entry["path"] if isinstance(entry, dict) else entry
+            if isinstance(entry, dict) and entry.get("index") is not None:
+                by_index[str(entry["index"])] = {"prompt": entry.get("prompt"), "path": path}
+            elif isinstance(entry, dict) and entry.get("prompt") is not None:
+                images.setdefault("by_prompt", {})[entry["prompt"]] = path
+            if path not in paths:
+                paths.append(path)
+        os.remove(log_path)
+        return True
+    
+    def _discard_image_log(self, session_id: str) -> None:
+        """Remove the image log of a session if there is one.
+        
+        Args:
+            session_id: The video session identifier
+        """
+        log_path = self._get_image_log_path(session_id)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+    
     def create_video_session(self, niche: str, language: str) -> str:
         """Create a new video generation session.
         
@@ -100,16 +438,19 @@ class VideoState:
             session_id: Unique identifier for this video generation session
         """
         session_id = str(uuid4())
+        now = datetime.now()
         self._state[session_id] = {
             "id": session_id,  # Add ID to the session data itself
-            "created_at": datetime.now().isoformat(),
+            "created_at": now.isoformat(),
+            "_updated_ts": now.timestamp(),
             "niche": niche,
             "language": language,
             "status": "initialized",
             "steps_completed": [],
             "data": {}
         }
-        self._save_state()
+        self._save_session(session_id)
+        self._index_session(session_id)
         return session_id
     
     def save_step_result(self, session_id: str, step: str, data: dict) -> None:
@@ -128,8 +469,75 @@ class VideoState:
         self._state[session_id]["steps_completed"].append(step)
         self._state[session_id]["data"][step] = data
         self._state[session_id]["status"] = "in_progress"
-        self._state[session_id]["last_updated"] = datetime.now().isoformat()
-        self._save_state()
+        now = datetime.now()
+        self._state[session_id]["last_updated"] = now.isoformat()
+        self._state[session_id]["_updated_ts"] = now.timestamp()
+        self._save_session(session_id)
+        self._index_session(session_id)
+    
+    def append_image_path(self, session_id: str, path: str, prompt: Optional[str] = None, index: Optional[int] = None) -> None:
+        """Record a generated image path in the session's append-only image log.
+        
+        Unlike save_step_result this writes a single line, so it is cheap to
+        call as each image finishes, also from several threads. The log is
+        folded into the session state when the session is resumed or completed.
+        
+        Args:
+            session_id: The video session identifier
+            path: The path to the generated image
+            prompt: The prompt the image was generated from
+            index: The position of the prompt, prompts may repeat
+        """
+        if session_id not in self._state:
+            if get_verbose():
+                error(f"Session {session_id} not found")
+            return
+        
+        try:
+            with open(self._get_image_log_path(session_id), 'ab') as f:
+                f.write(_json_dumps({"index": index, "prompt": prompt, "path": path}) + b"\n")
+        except Exception as e:
+            if get_verbose():
+                error(f"Failed to append image path: {str(e)}")
+    
+    def fold_image_paths(self, session_id: str, prompts: Optional[List[str]] = None) -> Dict[int, str]:
+        """Merge the session's image log into its saved images.
+        
+        Images are matched to prompts by position, so repeated prompts keep
+        an image each. An image recorded for a different prompt at the same
+        position is not matched. Images recorded by prompt only, by older
+        versions, are matched to the first unmatched position of their prompt.
+        
+        Args:
+            session_id: The video session identifier
+            prompts: The image prompts of the session, in order
+            
+        Returns:
+            The generated image path of each prompt index, for images recorded with their prompt
+        """
+        if session_id not in self._state:
+            if get_verbose():
+                error(f"Session {session_id} not found")
+            return {}
+        
+        if self._fold_image_log(session_id):
+            self._save_session(session_id)
+        
+        images = self._state[session_id]["data"].get("images", {})
+        generated = {}
+        for index, entry in images.get("by_index", {}).items():
+            index = int(index)
+            if prompts is None or (index < len(prompts) and entry.get("prompt") in (None, prompts[index])):
+                generated[index] = entry["path"]
+        
+        if prompts is not None:
+            for prompt, path in images.get("by_prompt", {}).items():
+                for index, image_prompt in enumerate(prompts):
+                    if image_prompt == prompt and index not in generated:
+                        generated[index] = path
+                        break
+        
+        return generated
     
     def mark_completed(self, session_id: str, video_path: str) -> None:
         """Mark a video session as completed.
@@ -143,10 +551,13 @@ class VideoState:
                 error(f"Session {session_id} not found")
             return
         
+        self._fold_image_log(session_id)
         self._state[session_id]["status"] = "completed"
         self._state[session_id]["video_path"] = video_path
-        self._state[session_id]["completed_at"] = datetime.now().isoformat()
-        self._save_state()
+        now = datetime.now()
+        self._state[session_id]["completed_at"] = now.isoformat()
+        self._state[session_id]["_completed_ts"] = now.timestamp()
+        self._save_session(session_id)
     
     def mark_failed(self, session_id: str, error_message: str) -> None:
         """Mark a video session as failed.
@@ -163,7 +574,8 @@ class VideoState:
         self._state[session_id]["status"] = "failed"
         self._state[session_id]["error"] = error_message
         self._state[session_id]["failed_at"] = datetime.now().isoformat()
-        self._save_state()
+        self._save_session(session_id)
+        self._index_session(session_id)
     
     def get_session(self, session_id: str) -> Optional[Dict]:
         """Get the state of a video session.
@@ -182,34 +594,50 @@ class VideoState:
         Returns:
             Dict of session_id to session state for all incomplete sessions
         """
+        rows = self._conn.execute(
+            f"SELECT id FROM sessions WHERE status IN ({', '.join('?' * len(INCOMPLETE_STATUSES))})",
+            INCOMPLETE_STATUSES
+        ).fetchall()
         return {
-            session_id: state 
-            for session_id, state in self._state.items() 
-            if state["status"] in ["initialized", "in_progress", "failed"]
+            session_id: self._state[session_id]
+            for session_id, in rows
+            if session_id in self._state
         }
     
+    def get_latest_incomplete_session(self) -> Optional[Dict]:
+        """Get the most recently updated incomplete session.
+        
+        Returns:
+            The session state, or None if there are no incomplete sessions
+        """
+        heap = self._incomplete_heap
+        while heap:
+            neg_updated_ts, session_id = heap[0]
+            session = self._state.get(session_id)
+            if (
+                session is not None
+                and session["status"] in INCOMPLETE_STATUSES
+                and session.get("_updated_ts", 0.0) == -neg_updated_ts
+            ):
+                return session
+            heapq.heappop(heap)
+        return None
+    
     def cleanup_completed_sessions(self, days_old: int = 7) -> None:
         """Remove completed sessions older than specified days.
         
         Args:
             days_old: Number of days after which to remove completed sessions
         """
-        now = datetime.now()
-        to_remove = []
-        
-        for session_id, state in self._state.items():
-            if state["status"] != "completed":
-                continue
-            
-            completed_at = datetime.fromisoformat(state["completed_at"])
-            if (now - completed_at).days > days_old:
-                to_remove.append(session_id)
-        
-        for session_id in to_remove:
-            del self._state[session_id]
+        # More than days_old full days since completion
+        cutoff = (datetime.now() - timedelta(days=days_old + 1)).timestamp()
+        to_remove = [
+            session_id for session_id, state in self._state.items()
+            if state["status"] == "completed" and state.get("_completed_ts", float("inf")) <= cutoff
+        ]
         
         if to_remove:
-            self._save_state()
+            self._delete_sessions(to_remove)
             
     def cleanup_incomplete_sessions(self) -> None:
         """Remove all incomplete sessions.
@@ -224,8 +652,7 @@ class VideoState:
                 to_remove.append(session_id)
         
         if to_remove:
-            for session_id in to_remove:
-                if get_verbose():
+            if get_verbose():
+                for session_id in to_remove:
                     info(f"Removing incomplete session: {session_id} (Status: {self._state[session_id]['status']})")
-                del self._state[session_id]
-            self._save_state() 
\ No newline at end of file
+            self._delete_sessions(to_remove)
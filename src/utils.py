@@ -1,12 +1,135 @@
+import io
 import os
+import sys
+import json
+import atexit
 import random
+import shutil
+import signal
 import zipfile
 import requests
 import platform
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
 from status import *
 from config import *
 
+# Songs archives up to this size are downloaded into memory, larger ones to a temporary file
+SONGS_SPOOL_SIZE = 64 << 20
+
+_SESSION = requests.Session()
+
+# Valid songs of the Songs directory, as (directory st_mtime_ns, [(name, path)]).
+# Adding, removing or renaming songs changes the mtime, which invalidates it.
+# It is also stored in SONGS_CACHE_FILE, as cron.py runs in a new process every time.
+_songs_cache = None
+SONGS_CACHE_FILE = os.path.join(ROOT_DIR, ".state", "songs_cache.json")
+
+# Process groups of the Selenium drivers started by this process, mapped to the
+# driver process leading each group, see register_selenium_service
+_selenium_process_groups = {}
+
+def get_selenium_service_kwargs() -> dict:
+    """
+    Gets the keyword arguments for a Selenium Service that start the driver,
+    and the browser it spawns, in a process group of their own.
+    Process groups are POSIX only, on Windows no arguments are added.
+
+    Returns:
+        kwargs (dict): The keyword arguments for the Service.
+    """
+    if platform.system() == "Windows":
+        return {}
+    return {"popen_kw": {"start_new_session": True}}
+
+def register_selenium_service(service) -> int:
+    """
+    Records the process group of a started Selenium service,
+    so kill_selenium_process_groups can kill it with a single signal.
+    Groups still running when this process exits, or is terminated by SIGTERM
+    or SIGHUP, are killed then, as the driver and browser do not get the
+    terminal's Ctrl+C or hangup in their own session.
+
+    Args:
+        service: The started Selenium Service.
+
+    Returns:
+        pgid (int): The process group ID, or None if it was not recorded.
+    """
+    process = getattr(service, "process", None)
+    if process is None or platform.system() == "Windows":
+        return None
+
+    try:
+        pgid = os.getpgid(process.pid)
+    except OSError:
+        return None
+
+    # Never record our own group, that would kill this process too
+    if pgid == os.getpgrp():
+        return None
+
+    _selenium_process_groups[pgid] = process
+    return pgid
+
+def unregister_selenium_service(pgid: int) -> None:
+    """
+    Forgets the process group of a Selenium service after its browser quit.
+
+    Args:
+        pgid (int): The process group ID returned by register_selenium_service.
+
+    Returns:
+        None
+    """
+    _selenium_process_groups.pop(pgid, None)
+
+def kill_selenium_process_groups() -> None:
+    """
+    Kills the recorded Selenium process groups, each driver together with its browser.
+    Groups whose driver already exited are skipped, their ID may have been reused.
+
+    Returns:
+        None
+    """
+    for pgid, process in list(_selenium_process_groups.items()):
+        if process.poll() is None:
+            try:
+                os.killpg(pgid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        unregister_selenium_service(pgid)
+
+atexit.register(kill_selenium_process_groups)
+
+def _exit_on_signal(signum, frame) -> None:
+    """
+    Kills the recorded Selenium process groups and exits, as atexit handlers
+    do not run when the process is terminated by a signal.
+
+    Args:
+        signum (int): The received signal.
+        frame: The interrupted stack frame.
+
+    Returns:
+        None
+    """
+    kill_selenium_process_groups()
+    sys.exit(128 + signum)
+
+# Keep handlers installed by whoever started us, e.g. nohup ignoring SIGHUP
+if platform.system() != "Windows":
+    for _signum in (signal.SIGTERM, signal.SIGHUP):
+        if signal.getsignal(_signum) == signal.SIG_DFL:
+            signal.signal(_signum, _exit_on_signal)
+
 def close_running_selenium_instances() -> None:
     """
     Closes any running Selenium instances.
@@ -18,10 +141,30 @@ def close_running_selenium_instances() -> None:
         info(" => Closing running Selenium instances...")
 
         # Kill all running Firefox instances
-        if platform.system() == "Windows":
-            os.system("taskkill /f /im firefox.exe")
+        if psutil is None:
+            if platform.system() == "Windows":
+                os.system("taskkill /f /im firefox.exe")
+            else:
+                os.system("pkill firefox")
         else:
-            os.system("pkill firefox")
+            processes = [
+                process for process in psutil.process_iter(["name"])
+                if process.info["name"] and "firefox" in process.info["name"].lower()
+            ]
+
+            # Terminate gracefully first, then kill whatever is still alive
+            for process in processes:
+                try:
+                    process.terminate()
+                except psutil.NoSuchProcess:
+                    pass
+
+            _, alive = psutil.wait_procs(processes, timeout=3)
+            for process in alive:
+                try:
+                    process.kill()
+                except psutil.NoSuchProcess:
+                    pass
 
         success(" => Closed running Selenium instances.")
 
@@ -40,6 +183,23 @@ def build_url(youtube_video_id: str) -> str:
     """
     return f"https://www.youtube.com/watch?v={youtube_video_id}"
 
+def link_or_copy(src: str, dst: str) -> None:
+    """
+    Hard links a file to a new path, falling back to a copy when
+    linking is not possible (e.g. different filesystems or Windows FAT drives).
+
+    Args:
+        src (str): The path to the existing file.
+        dst (str): The path to link or copy the file to.
+
+    Returns:
+        None
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
 def rem_temp_files() -> None:
     """
     Removes temporary files in the `.mp` directory, except for MP4 files and JSON files.
@@ -50,12 +210,11 @@ def rem_temp_files() -> None:
     # Path to the `.mp` directory
     mp_dir = os.path.join(ROOT_DIR, ".mp")
 
-    files = os.listdir(mp_dir)
-
-    for file in files:
-        # Keep JSON and MP4 files
-        if not file.endswith(".json") and not file.endswith(".mp4"):
-            os.remove(os.path.join(mp_dir, file))
+    with os.scandir(mp_dir) as entries:
+        for entry in entries:
+            # Keep JSON and MP4 files
+            if entry.is_file() and not entry.name.endswith((".json", ".mp4")):
+                os.remove(entry.path)
 
 def fetch_songs() -> None:
     """
@@ -76,61 +235,110 @@ def fetch_songs() -> None:
             # Skip if songs are already downloaded
             return
 
-        # Download songs
-        response = requests.get(get_zip_url() or "https://filebin.net/bb9ewdtckolsf3sg/drive-download-20240209T180019Z-001.zip")
+        # Stream the songs archive into memory, or into a temporary file when it is large
+        # or of unknown size (SpooledTemporaryFile is not seekable enough for zipfile before 3.11)
+        with _SESSION.get(get_zip_url() or "https://filebin.net/bb9ewdtckolsf3sg/drive-download-20240209T180019Z-001.zip", stream=True) as response:
+            response.raise_for_status()
+            size = int(response.headers.get("Content-Length") or 0)
+            archive = io.BytesIO() if 0 < size <= SONGS_SPOOL_SIZE else tempfile.TemporaryFile()
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                archive.write(chunk)
 
-        # Save the zip file
-        with open(os.path.join(files_dir, "songs.zip"), "wb") as file:
-            file.write(response.content)
+        with archive:
+            with zipfile.ZipFile(archive, "r") as file:
+                members = file.infolist()
 
-        # Unzip the file
-        with zipfile.ZipFile(os.path.join(files_dir, "songs.zip"), "r") as file:
-            file.extractall(files_dir)
+                # Create all directories on this thread first, parallel extracts
+                # race each other when creating a shared parent directory
+                for member in members:
+                    parts = [part for part in member.filename.split("/") if part not in ("", ".", "..")]
+                    os.makedirs(os.path.join(files_dir, *(parts if member.is_dir() else parts[:-1])), exist_ok=True)
 
-        # Remove the zip file
-        os.remove(os.path.join(files_dir, "songs.zip"))
+                # Write the files in parallel, decompression releases the GIL
+                songs = [member for member in members if not member.is_dir()]
+                with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                    list(executor.map(lambda member: file.extract(member, files_dir), songs))
 
         success(" => Downloaded Songs to ../Songs.")
 
     except Exception as e:
         error(f"Error occurred while fetching songs: {str(e)}")
 
+def _load_songs_cache() -> tuple:
+    """
+    Loads the song list stored by a previous run.
+
+    Returns:
+        cache (tuple): The (st_mtime_ns, songs) of the Songs directory, or None.
+    """
+    try:
+        with open(SONGS_CACHE_FILE, "r") as file:
+            cache = json.load(file)
+        return (cache["mtime_ns"], [tuple(song) for song in cache["songs"]])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _save_songs_cache(cache: tuple) -> None:
+    """
+    Stores the song list for the next run.
+
+    Args:
+        cache (tuple): The (st_mtime_ns, songs) of the Songs directory.
+
+    Returns:
+        None
+    """
+    try:
+        os.makedirs(os.path.dirname(SONGS_CACHE_FILE), exist_ok=True)
+        temp_path = f"{SONGS_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"mtime_ns": cache[0], "songs": cache[1]}, file)
+        os.replace(temp_path, SONGS_CACHE_FILE)
+    except OSError as e:
+        if get_verbose():
+            warning(f"Failed to store the song list: {str(e)}")
+
 def choose_random_song() -> str:
     """
     Chooses a random song from the songs/ directory.
     Only includes valid MP3 files and performs validation checks.
+    The directory is only scanned again once its modification time changes.
 
     Returns:
         str: The path to the chosen song, or None if no valid songs are found.
     """
+    global _songs_cache
+
     try:
         songs_dir = os.path.join(ROOT_DIR, "Songs")
-        if not os.path.exists(songs_dir):
+        try:
+            mtime_ns = os.stat(songs_dir).st_mtime_ns
+        except FileNotFoundError:
             error(f"Songs directory not found at: {songs_dir}")
             return None
 
-        # Get all MP3 files from the directory
-        songs = [f for f in os.listdir(songs_dir) 
-                if f.lower().endswith('.mp3') 
-                and os.path.isfile(os.path.join(songs_dir, f))
-                and not f.startswith('.')]  # Exclude hidden files like .DS_Store
+        if not _songs_cache or _songs_cache[0] != mtime_ns:
+            _songs_cache = _load_songs_cache()
+
+        if _songs_cache and _songs_cache[0] == mtime_ns:
+            songs = _songs_cache[1]
+        else:
+            # Get all non-empty MP3 files from the directory in a single scan
+            with os.scandir(songs_dir) as entries:
+                songs = [(entry.name, entry.path) for entry in entries
+                        if entry.name.lower().endswith('.mp3')
+                        and not entry.name.startswith('.')  # Exclude hidden files like .DS_Store
+                        and entry.is_file()
+                        and entry.stat().st_size > 0]
+            _songs_cache = (mtime_ns, songs)
+            _save_songs_cache(_songs_cache)
         
         if not songs:
             error("No valid MP3 files found in Songs directory")
             return None
             
         # Choose a random song
-        song = random.choice(songs)
-        song_path = os.path.join(songs_dir, song)
-        
-        # Validate the chosen file
-        if not os.path.exists(song_path):
-            error(f"Chosen song file does not exist: {song_path}")
-            return None
-            
-        if os.path.getsize(song_path) == 0:
-            error(f"Chosen song file is empty: {song_path}")
-            return None
+        song, song_path = random.choice(songs)
             
         success(f" => Chose song: {song}")
         return song_path